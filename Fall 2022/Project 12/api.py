@@ -1,31 +1,94 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
-from fastapi.templating import Jinja2Templates
-import sqlite3
-from .database import queries, database_path
+from fastapi import FastAPI, Request, Query, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import os
+import json
+import orjson
+from typing import List, Optional
+from . import database
+from .database import ConnectionPool, prepare_database, has_search_index, search_query
+from .cache import ResponseCache
 from .import schemas
 
-app = FastAPI()
-templates = Jinja2Templates(directory='templates')
+# serialized /titles/{title_id} responses, so popular titles skip sqlite and serialization
+title_cache = ResponseCache(max_entries=int(os.getenv("TITLE_CACHE_ENTRIES", 4096)),
+                            max_bytes=int(os.getenv("TITLE_CACHE_BYTES", 64 * 1024 * 1024)),
+                            ttl=float(os.getenv("TITLE_CACHE_TTL", 300)))
+
+
+class OrjsonResponse(Response):
+    """
+    JSON response serialized with orjson, which is several times faster than the json module for these rows.
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+
+MAX_BATCH_IDS = 1000
+MAX_PAGE_SIZE = 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_database(database.database_path)
+    app.state.search_ready = has_search_index(database.database_path)
+    app.state.pool = ConnectionPool(database.database_path, size=int(os.getenv("DATABASE_POOL_SIZE", 8)))
+    yield
+    app.state.pool.close()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=OrjsonResponse)
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    # jinja2 is only imported if a page is rendered
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory='templates')
+
+
+# rows come back from queries.sql in the order of these fields
+TITLE_FIELDS = tuple(schemas.Title.model_fields)
+TITLE_ENTRY_FIELDS = tuple(schemas.TitleEntry.model_fields)
+
+
+def row_to_dict(fields, row):
+    """
+    Map a row straight to the response dict, with numbers as strings like the schemas, without building a model.
+    """
+    return {key: value if value is None or isinstance(value, str) else str(value) for key, value in zip(fields, row)}
+
+
+def title_entries(results):
+    return [row_to_dict(TITLE_ENTRY_FIELDS, tup) for tup in results]
 
 
 @app.get("/")
 async def root():
-    return JSONResponse({"message": "Hello World"})
+    return OrjsonResponse({"message": "Hello World"})
+
+
+def fetch_title(pool, title_id):
+    # runs in a worker thread so the query never blocks the event loop
+    with pool.connection() as c:
+        return database.queries.get_title(c, title_id=title_id)
 
 
 @app.get("/titles/{title_id}", response_model = schemas.Title)
 #@app.get("/titles/{title_id}")
-async def get_title(title_id: str):
-    conn = sqlite3.connect(database_path)
-    with conn as c:
-        results = queries.get_title(c, title_id=title_id)
-    new_results = []
-    for tup in results:
-        new_results.append(list(tup))
-        
-    new_results = {key: new_results[0][i] for i, key in enumerate(schemas.Title.__fields__.keys())}
-    return schemas.Title(**new_results)
+async def get_title(title_id: str, request: Request):
+    body = title_cache.get(title_id)
+    if body is None:
+        results = await run_in_threadpool(fetch_title, request.app.state.pool, title_id)
+        if not results:
+            raise HTTPException(status_code=404, detail=f"no title with id {title_id}")
+        body = orjson.dumps(row_to_dict(TITLE_FIELDS, results[0]))
+        title_cache.set(title_id, body)
+    return Response(content=body, media_type="application/json")
 
     #new_results = []
     #for tup in results:
@@ -37,6 +100,93 @@ async def get_title(title_id: str):
     #new_results = {key: new_results[0][i] for i, key in enumerate(schemas.Title.__fields__.keys())}
     #return schemas.Title(**new_results)
 
+
+def fetch_titles(pool, title_ids):
+    with pool.connection() as c:
+        return database.queries.get_titles(c, title_ids=json.dumps(title_ids))
+
+
+def fetch_title_page(pool, after, limit):
+    with pool.connection() as c:
+        return database.queries.list_titles(c, after=after, limit=limit)
+
+
+async def stream_title_pages(pool, after, limit):
+    # one keyset page at a time, so memory stays flat however many titles are streamed
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = MAX_PAGE_SIZE if remaining is None else min(remaining, MAX_PAGE_SIZE)
+        results = await run_in_threadpool(fetch_title_page, pool, after, page_size)
+        if not results:
+            break
+        yield b"".join(orjson.dumps(entry) + b"\n" for entry in title_entries(results))
+        after = results[-1][0]
+        if remaining is not None:
+            remaining -= len(results)
+        if len(results) < page_size:
+            break
+
+
+@app.get("/titles")
+async def get_titles(request: Request, ids: Optional[List[str]] = Query(None), after: str = "",
+                     limit: Optional[int] = Query(None, ge=1), format: str = Query("json", pattern="^(json|ndjson)$")):
+    """
+    With ids (comma separated and/or repeated), the titles with those ids in the order they were asked for.
+    Otherwise a page of titles in title_id order after `after`: as JSON with the `after` for the next page, or as
+    NDJSON streamed page by page, where leaving out limit streams every remaining title.
+    """
+    pool = request.app.state.pool
+    if ids is not None:
+        title_ids = list(dict.fromkeys(i for value in ids for i in value.split(",") if i))
+        if len(title_ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH_IDS} ids per request")
+        by_id = {entry["title_id"]: entry for entry in title_entries(await run_in_threadpool(fetch_titles, pool, title_ids))}
+        entries = [by_id[i] for i in title_ids if i in by_id]
+        if format == "ndjson":
+            return Response(content=b"".join(orjson.dumps(entry) + b"\n" for entry in entries), media_type="application/x-ndjson")
+        return OrjsonResponse(entries)
+    
+    if format == "ndjson":
+        return StreamingResponse(stream_title_pages(pool, after, limit), media_type="application/x-ndjson")
+    if limit is None:
+        limit = 100
+    if limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit is at most {MAX_PAGE_SIZE} unless format=ndjson")
+    entries = title_entries(await run_in_threadpool(fetch_title_page, pool, after, limit))
+    next_after = entries[-1]["title_id"] if len(entries) == limit else None
+    return OrjsonResponse({"titles": entries, "next_after": next_after})
+
+
+def fetch_search_page(pool, query, limit, offset):
+    with pool.connection() as c:
+        return database.queries.search_titles(c, query=query, limit=limit, offset=offset)
+
+
+@app.get("/search")
+async def search(request: Request, q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100),
+                 offset: int = Query(0, ge=0)):
+    """
+    Titles whose primary title contains every word of q, best match first. Needs the titles_fts index, see
+    `python database.py build-search`, and answers 503 until it exists.
+    """
+    if not request.app.state.search_ready:
+        # checked again, so building the index doesn't need a restart
+        request.app.state.search_ready = await run_in_threadpool(has_search_index, database.database_path)
+        if not request.app.state.search_ready:
+            raise HTTPException(status_code=503, detail="search is unavailable until the titles_fts index is built "
+                                                        "with `python database.py build-search`")
+    query = search_query(q)
+    if query is None:
+        return OrjsonResponse({"titles": []})
+    results = await run_in_threadpool(fetch_search_page, request.app.state.pool, query, limit, offset)
+    return OrjsonResponse({"titles": title_entries(results)})
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return OrjsonResponse(title_cache.stats())
+
+
 #@app.post("/titles/{title_id}")
 #async def make_title(title: Title):
     #return Title
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Load test for the titles API against a synthetic `titles` table, so it doesn't
+need the real database. Each app is served by uvicorn in a subprocess and hit
+with concurrent requests from httpx, so a handler that blocks the event loop
+shows up in the latencies.
+
+Cold start (importing the app) and per-request CPU time are measured first,
+in a subprocess and in process respectively, each next to the old path:
+templates and queries loaded eagerly at import, and a pydantic model built
+and encoded for every row.
+
+Usage:
+    python bench_api.py [number_titles] [number_requests] [concurrency]
+"""
+
+import os
+import sys
+import json
+import statistics
+import time
+import random
+import sqlite3
+import asyncio
+import subprocess
+import tempfile
+import importlib
+import importlib.machinery
+import importlib.util
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+HERE = Path(__file__).resolve().parent
+
+
+def make_synthetic_titles(path, number_titles, seed=0):
+    """
+    Write a `titles` table shaped like the IMDB one to a new sqlite database at `path`.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE titles (title_id TEXT PRIMARY KEY, type TEXT, primary_title TEXT, original_title TEXT, "
+                 "is_adult INTEGER, premiered TEXT, ended TEXT, runtime_minutes TEXT, genres TEXT)")
+    conn.executemany("INSERT INTO titles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     ((f"tt{i:07d}", "movie", f"Synthetic Title {i}", f"Synthetic Title {i}", 0,
+                       str(rng.randrange(1900, 2023)), None, str(rng.randrange(60, 200)), "Drama")
+                      for i in range(number_titles)))
+    conn.commit()
+    conn.close()
+
+
+def load_api():
+    """
+    Import `api.py` as part of a package, since it uses relative imports and
+    the directory name has a space in it. DATABASE_PATH must already be set.
+    """
+    spec = importlib.machinery.ModuleSpec("project12", None, is_package=True)
+    package = importlib.util.module_from_spec(spec)
+    package.__path__ = [str(HERE)]
+    sys.modules["project12"] = package
+    return importlib.import_module("project12.api")
+
+
+def connect_per_request_app(api):
+    """
+    The handler as it was before the connection pool: a new connection per
+    request and the query run on the event loop.
+    """
+    app = FastAPI()
+
+    @app.get("/titles/{title_id}", response_model=api.schemas.Title)
+    async def get_title(title_id: str):
+        conn = sqlite3.connect(api.database.database_path)
+        with conn as c:
+            results = api.database.queries.get_title(c, title_id=title_id)
+        row = list(results[0])
+        return api.schemas.Title(**{key: row[i] for i, key in enumerate(api.schemas.Title.model_fields.keys())})
+
+    return app
+
+
+def model_serialization_app(api):
+    """
+    The handlers as they were before rows were serialized directly: a pydantic
+    model per row, encoded with jsonable_encoder and the json module. They use
+    the same pool and queries as the current app, so only serialization differs.
+    """
+    app = FastAPI(lifespan=api.lifespan)
+
+    @app.get("/titles/{title_id}", response_model=api.schemas.Title)
+    async def get_title(title_id: str, request: Request):
+        results = await run_in_threadpool(api.fetch_title, request.app.state.pool, title_id)
+        row = list(results[0])
+        title = api.schemas.Title(**{key: row[i] for i, key in enumerate(api.schemas.Title.model_fields.keys())})
+        return Response(content=json.dumps(jsonable_encoder(title)).encode(), media_type="application/json")
+
+    @app.get("/titles")
+    async def get_titles(ids: str, request: Request):
+        title_ids = list(dict.fromkeys(i for i in ids.split(",") if i))
+        results = await run_in_threadpool(api.fetch_titles, request.app.state.pool, title_ids)
+        keys = api.schemas.TitleEntry.model_fields.keys()
+        entries = [jsonable_encoder(api.schemas.TitleEntry(**dict(zip(keys, tup)))) for tup in results]
+        by_id = {entry["title_id"]: entry for entry in entries}
+        return JSONResponse([by_id[i] for i in title_ids if i in by_id])
+
+    return app
+
+
+def serve(app_name, port):
+    """
+    Start uvicorn serving either the current app ("pool") or the old handler
+    ("per_request") in a subprocess, and wait until it accepts requests.
+    """
+    process = subprocess.Popen([sys.executable, "-W", "ignore::DeprecationWarning", __file__, "--serve", app_name, str(port)])
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/")
+            return process
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"{app_name} app did not start on port {port}")
+
+
+async def load_test(port, title_ids, concurrency):
+    """
+    Send one GET per title id with `concurrency` requests in flight, returning
+    requests per second and the sorted latencies in seconds.
+    """
+    latencies = []
+    pending = iter(title_ids)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+        async def worker():
+            for title_id in pending:
+                start = time.perf_counter()
+                response = await client.get(f"/titles/{title_id}")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+    return len(title_ids) / seconds, sorted(latencies)
+
+
+COLD_START = """
+import time, asyncio
+start = time.perf_counter()
+import bench_api
+api = bench_api.load_api()
+if {eager}:
+    # what importing the app used to do: build the templates, load .env and parse queries.sql
+    api.get_templates()
+    api.database.database_path
+    api.database.queries
+imported = time.perf_counter()
+
+async def startup():
+    async with api.app.router.lifespan_context(api.app):
+        pass
+
+asyncio.run(startup())
+print(imported - start, time.perf_counter() - start)
+"""
+
+
+def cold_start(eager):
+    """
+    Seconds for a fresh interpreter to import the app, and to import it and run
+    its startup, not counting the interpreter's own startup. With eager, import
+    also does the work it used to: templates, .env and queries.sql.
+    """
+    code = COLD_START.replace("{eager}", str(eager))
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=HERE, check=True, capture_output=True,
+                            text=True).stdout
+    return [float(t) for t in output.split()]
+
+
+def bench_cold_start(runs=5):
+    """
+    Median cold start with templates and queries loaded eagerly, as before, and lazily, as now. The two alternate,
+    so neither gets a warmer file cache.
+    """
+    eager, lazy = [], []
+    for _ in range(runs):
+        eager.append(cold_start(True))
+        lazy.append(cold_start(False))
+    for i, label in enumerate(["import", "import and startup"]):
+        print(f"cold start, {label}: {statistics.median(t[i] for t in eager) * 1e3:.1f}ms eager, "
+              f"{statistics.median(t[i] for t in lazy) * 1e3:.1f}ms lazy")
+
+
+async def request_cpu(app, paths):
+    """
+    CPU seconds per request for `paths` sent one after another in process,
+    including the httpx client's share.
+    """
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path in paths[:50]:  # warm up
+                await client.get(path)
+            start = time.process_time()
+            for path in paths:
+                (await client.get(path)).raise_for_status()
+            return (time.process_time() - start) / len(paths)
+
+
+def bench_request_cpu(api, title_ids):
+    api.title_cache.invalidate()
+    cache_size = api.title_cache.max_entries
+    api.title_cache.max_entries = 0  # measure the full path, not cache hits
+    try:
+        old_app = model_serialization_app(api)
+        for label, paths in [("/titles/{title_id}", [f"/titles/{i}" for i in title_ids]),
+                             ("/titles?ids= (100 ids)", [f"/titles?ids={','.join(title_ids[i:i + 100])}"
+                                                         for i in range(0, len(title_ids), 100)])]:
+            old = asyncio.run(request_cpu(old_app, paths))
+            new = asyncio.run(request_cpu(api.app, paths))
+            print(f"CPU per request {label}: {old * 1e6:.0f}us with a model per row, {new * 1e6:.0f}us direct")
+    finally:
+        api.title_cache.max_entries = cache_size
+
+
+def report(label, throughput, latencies):
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e3
+    print(f"{label}: {throughput:.0f} req/s, p50 {percentile(0.5):.2f}ms, p99 {percentile(0.99):.2f}ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        import uvicorn
+        api = load_api()
+        app = api.app if sys.argv[2] == "pool" else connect_per_request_app(api)
+        uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[3]), log_level="warning")
+        sys.exit()
+
+    # imported here rather than at the top, so the cold start only measures the app's own imports
+    import httpx
+
+    number_titles = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    number_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ["DATABASE_PATH"] = str(Path(work_dir) / "imdb.db")
+        make_synthetic_titles(os.environ["DATABASE_PATH"], number_titles)
+        rng = random.Random(1)
+        title_ids = [f"tt{rng.randrange(number_titles):07d}" for _ in range(number_requests)]
+        api = load_api()
+        sys.modules["project12.database"].build_search_index(os.environ["DATABASE_PATH"])
+        bench_cold_start()
+        bench_request_cpu(api, title_ids)
+        # most traffic goes to a few thousand popular titles
+        popular = [f"tt{rng.randrange(number_titles):07d}" for _ in range(2_000)]
+        skewed_ids = [rng.choice(popular) if rng.random() < 0.9 else f"tt{rng.randrange(number_titles):07d}"
+                      for _ in range(number_requests)]
+        runs = [("connection per request", "per_request", title_ids),
+                ("connection pool", "pool", title_ids),
+                ("connection pool, skewed traffic", "pool", skewed_ids)]
+        for port, (label, app_name, ids) in enumerate(runs, start=8765):
+            server = serve(app_name, port)
+            try:
+                report(label, *asyncio.run(load_test(port, ids, concurrency)))
+                if app_name == "pool":
+                    print(f"  cache: {httpx.get(f'http://127.0.0.1:{port}/cache/stats').json()}")
+            finally:
+                server.terminate()
+                server.wait()
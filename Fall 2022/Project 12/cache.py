@@ -0,0 +1,83 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    An in-process LRU cache with a time-to-live on every entry, bounded by both the number of entries and their
+    total size in bytes.
+    
+    Values are usually the serialized JSON body of a response, so a hit can be sent back as-is. Other values are
+    sized with sys.getsizeof unless a size is given.
+    """
+    def __init__(self, max_entries=4096, max_bytes=64 * 1024 * 1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value, size), least recently used first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None if it is missing or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None, size=None):
+        """
+        Cache `value` under `key` for `ttl` seconds (the cache's ttl by default), evicting the least recently used
+        entries until it fits. Values larger than max_bytes are not cached.
+        """
+        if size is None:
+            size = len(value) if isinstance(value, (bytes, bytearray, memoryview)) else sys.getsizeof(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            while self._entries and (len(self._entries) >= self.max_entries or self.size + size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value, size)
+            self.size += size
+
+    def invalidate(self, key=None):
+        """
+        Drop `key` from the cache, or every entry if no key is given, e.g. after the database changes.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.size = 0
+            else:
+                self._remove(key)
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
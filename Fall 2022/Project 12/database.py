@@ -1,10 +1,238 @@
 import os
-import aiosql
+import re
+import argparse
+import queue
+import logging
 import sqlite3
-from dotenv import load_dotenv
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
-load_dotenv()
 
-database_path = Path(os.getenv("DATABASE_PATH"))
-queries = aiosql.from_path(Path(__file__).parents[0] / "queries.sql", "sqlite3")
\ No newline at end of file
+# database_path and queries are loaded on first use rather than at import, so importing the app stays cheap
+@lru_cache(maxsize=None)
+def get_database_path():
+    from dotenv import load_dotenv
+    load_dotenv()
+    return Path(os.getenv("DATABASE_PATH"))
+
+
+@lru_cache(maxsize=None)
+def get_queries():
+    import aiosql
+    return aiosql.from_path(Path(__file__).parents[0] / "queries.sql", "sqlite3")
+
+
+def __getattr__(name):
+    if name == "database_path":
+        value = get_database_path()
+    elif name == "queries":
+        value = get_queries()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value  # later lookups don't come back here
+    return value
+
+
+logger = logging.getLogger(__name__)
+
+# applied to every pooled connection, tuned for a read-mostly workload
+READ_PRAGMAS = {
+    "mmap_size": 1024 * 1024 * 1024,  # read pages through a memory map instead of read() calls
+    "cache_size": -64 * 1024,  # negative means KiB, so 64 MiB of page cache per connection
+    "temp_store": "MEMORY",
+}
+
+# indexes the queries in queries.sql rely on, created by prepare_database(create_indexes=True)
+INDEXES = {
+    "titles_title_id": "CREATE UNIQUE INDEX IF NOT EXISTS titles_title_id ON titles(title_id)",
+}
+
+# external content FTS5 index over titles.primary_title, kept in sync with titles by triggers
+SEARCH_INDEX = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5(primary_title, content='titles', content_rowid='rowid',
+       tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS titles_fts_insert AFTER INSERT ON titles BEGIN
+       INSERT INTO titles_fts(rowid, primary_title) VALUES (new.rowid, new.primary_title); END""",
+    """CREATE TRIGGER IF NOT EXISTS titles_fts_delete AFTER DELETE ON titles BEGIN
+       INSERT INTO titles_fts(titles_fts, rowid, primary_title) VALUES ('delete', old.rowid, old.primary_title); END""",
+    """CREATE TRIGGER IF NOT EXISTS titles_fts_update AFTER UPDATE OF primary_title ON titles BEGIN
+       INSERT INTO titles_fts(titles_fts, rowid, primary_title) VALUES ('delete', old.rowid, old.primary_title);
+       INSERT INTO titles_fts(rowid, primary_title) VALUES (new.rowid, new.primary_title); END""",
+]
+
+FULL_SCAN = re.compile(r"\bSCAN (TABLE )?titles\b")
+
+
+class QueryPlanError(RuntimeError):
+    pass
+
+
+class _AnyParameter(dict):
+    # binds NULL to every named parameter, enough for EXPLAIN QUERY PLAN
+    def __missing__(self, key):
+        return None
+
+
+def apply_pragmas(conn, pragmas=READ_PRAGMAS):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def full_scans(conn):
+    """
+    Run EXPLAIN QUERY PLAN for every query in queries.sql and return (query name, plan step) for each step that
+    scans the whole titles table, or that could not be planned at all. Queries on titles_fts are skipped until the
+    search index has been built, since they can't be planned without it.
+    """
+    queries = get_queries()
+    search_ready = _search_index_exists(conn)
+    problems = []
+    for name in queries.available_queries:
+        if name.endswith("_cursor"):
+            continue
+        if not search_ready and "titles_fts" in getattr(queries, name).sql:
+            continue
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {getattr(queries, name).sql}", _AnyParameter()).fetchall()
+        except sqlite3.Error as e:
+            problems.append((name, str(e)))
+            continue
+        problems.extend((name, step[-1]) for step in plan if FULL_SCAN.search(step[-1]))
+    return problems
+
+
+def prepare_database(path, strict=None, create_indexes=None):
+    """
+    Startup checks for the API: switch the database to WAL, optionally create INDEXES, then make sure no query in
+    queries.sql does a full scan of titles. A scan is logged as a warning, or raises QueryPlanError if strict. A
+    missing search index is only logged, since /search answers 503 until it is built.
+    
+    strict and create_indexes default to the DATABASE_STRICT_PLANS and DATABASE_CREATE_INDEXES environment variables.
+    Both need write access to the database; if it is read-only, WAL is skipped with a warning.
+    """
+    if strict is None:
+        strict = os.getenv("DATABASE_STRICT_PLANS", "0") == "1"
+    if create_indexes is None:
+        create_indexes = os.getenv("DATABASE_CREATE_INDEXES", "0") == "1"
+    
+    conn = sqlite3.connect(path)
+    try:
+        try:
+            conn.execute("PRAGMA journal_mode = WAL")
+        except sqlite3.OperationalError as e:
+            logger.warning("could not switch %s to WAL: %s", path, e)
+        if create_indexes:
+            with conn:
+                for name, statement in INDEXES.items():
+                    conn.execute(statement)
+        problems = full_scans(conn)
+        if not _search_index_exists(conn):
+            logger.warning("%s has no titles_fts search index, /search is unavailable until "
+                           "`python database.py build-search` is run", path)
+    finally:
+        conn.close()
+    
+    for name, detail in problems:
+        logger.warning("query %s: %s", name, detail)
+    if problems and strict:
+        raise QueryPlanError(f"{len(problems)} queries scan titles: " + "; ".join(f"{n}: {d}" for n, d in problems))
+    return problems
+
+
+def build_search_index(path):
+    """
+    Create the titles_fts search index and its triggers if they don't exist, then rebuild it from titles, so it
+    also catches up with changes made before the triggers were there.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            for statement in SEARCH_INDEX:
+                conn.execute(statement)
+            conn.execute("INSERT INTO titles_fts(titles_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO titles_fts(titles_fts) VALUES ('optimize')")
+    finally:
+        conn.close()
+
+
+def has_search_index(path):
+    """
+    Whether the titles_fts search index has been created, see build_search_index.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return _search_index_exists(conn)
+    finally:
+        conn.close()
+
+
+def _search_index_exists(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'titles_fts'").fetchone() is not None
+
+
+def search_query(text):
+    """
+    Turn free text into an FTS5 query matching titles that contain every word, the last one as a prefix. Words are
+    quoted, so FTS5 operators and syntax in the text are searched for literally. Returns None if there are no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+class ConnectionPool:
+    """
+    A fixed set of read-only sqlite connections, opened once at startup and shared by the threads that run queries.
+    
+    Connections are opened with check_same_thread=False because whichever worker thread picks up a request borrows
+    one, and only one thread uses a connection at a time.
+    """
+    def __init__(self, path, size=8, timeout=30, pragmas=READ_PRAGMAS):
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        uri = f"file:{Path(path).resolve().as_posix()}?mode=ro"
+        for _ in range(size):
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            apply_pragmas(conn, pragmas)
+            self._connections.append(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection, waiting up to `timeout` seconds if they are all in use.
+        """
+        conn = self._idle.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance commands for the titles database.")
+    parser.add_argument("--path", default=None, help="database to use, DATABASE_PATH by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build-search", help="create or rebuild the titles_fts full-text index")
+    commands.add_parser("create-indexes", help="create the indexes in INDEXES")
+    commands.add_parser("check", help="list queries in queries.sql that scan titles")
+    args = parser.parse_args()
+    args.path = args.path or get_database_path()
+    
+    if args.command == "build-search":
+        build_search_index(args.path)
+    elif args.command == "create-indexes":
+        prepare_database(args.path, create_indexes=True)
+    else:
+        conn = sqlite3.connect(args.path)
+        for name, detail in full_scans(conn):
+            print(f"{name}: {detail}")
+        conn.close()
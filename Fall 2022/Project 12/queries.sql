@@ -2,3 +2,15 @@
 -- Get many types of information from the database
 SELECT primary_title, premiered, runtime_minutes FROM titles WHERE title_id = :title_id;
 
+
+-- name: get_titles
+-- Get the same information as get_title, plus the title_id, for every title in :title_ids (a JSON array)
+SELECT title_id, primary_title, premiered, runtime_minutes FROM titles WHERE title_id IN (SELECT value FROM json_each(:title_ids));
+
+-- name: list_titles
+-- Page through titles in title_id order, the next :limit titles after :after
+SELECT title_id, primary_title, premiered, runtime_minutes FROM titles WHERE title_id > :after ORDER BY title_id LIMIT :limit;
+
+-- name: search_titles
+-- Titles whose primary_title matches the FTS5 query :query, best bm25 match first
+SELECT titles.title_id, titles.primary_title, titles.premiered, titles.runtime_minutes FROM titles_fts JOIN titles ON titles.rowid = titles_fts.rowid WHERE titles_fts MATCH :query ORDER BY bm25(titles_fts) LIMIT :limit OFFSET :offset;
@@ -10,5 +10,12 @@ class Title(BaseModel):
         orm_mode: True
 
 
+class TitleEntry(BaseModel):
+    title_id: str
+    title: str
+    premiered: str
+    runtime: str
+
+
 
 
@@ -0,0 +1,195 @@
+import pytest
+import json
+import sqlite3
+from fastapi.testclient import TestClient
+
+from bench_api import make_synthetic_titles, load_api
+from cache import ResponseCache
+from database import build_search_index, prepare_database, QueryPlanError
+
+NUMBER_TITLES = 2500
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    path = tmp_path_factory.mktemp("db") / "titles.db"
+    make_synthetic_titles(path, NUMBER_TITLES)
+    build_search_index(path)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("DATABASE_PATH", str(path))
+        api = load_api()
+        api.database.database_path  # resolved while DATABASE_PATH points at the synthetic database
+    return api
+
+
+@pytest.fixture
+def client(api):
+    api.title_cache.invalidate()
+    with TestClient(api.app) as client:
+        yield client
+
+
+def title_id(i):
+    return f"tt{i:07d}"
+
+
+def test_get_title(client):
+    response = client.get(f"/titles/{title_id(42)}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Synthetic Title 42"
+    response = client.get("/titles/nope")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "no title with id nope"}
+
+
+def test_titles_by_ids(client):
+    # repeated and comma separated ids come back in the order asked for, once each, skipping unknown ids
+    response = client.get("/titles", params={"ids": [f"{title_id(5)},{title_id(2)}", title_id(9), title_id(5), "tt9999999"]})
+    assert response.status_code == 200
+    assert [entry["title_id"] for entry in response.json()] == [title_id(5), title_id(2), title_id(9)]
+
+
+def test_titles_by_ids_cap(client, api):
+    ids = [title_id(i) for i in range(api.MAX_BATCH_IDS)]
+    response = client.get("/titles", params={"ids": ",".join(ids)})
+    assert [entry["title_id"] for entry in response.json()] == ids
+    # duplicates don't count towards the cap
+    assert client.get("/titles", params={"ids": ",".join(ids + ids[:10])}).status_code == 200
+    assert client.get("/titles", params={"ids": ",".join(ids + [title_id(api.MAX_BATCH_IDS)])}).status_code == 400
+
+
+def test_titles_pages(client, api):
+    seen = []
+    after = ""
+    while after is not None:
+        page = client.get("/titles", params={"after": after, "limit": api.MAX_PAGE_SIZE}).json()
+        seen.extend(entry["title_id"] for entry in page["titles"])
+        after = page["next_after"]
+    assert seen == [title_id(i) for i in range(NUMBER_TITLES)]
+
+    page = client.get("/titles", params={"after": title_id(10), "limit": 3}).json()
+    assert [entry["title_id"] for entry in page["titles"]] == [title_id(11), title_id(12), title_id(13)]
+    assert page["next_after"] == title_id(13)
+    assert client.get("/titles", params={"limit": api.MAX_PAGE_SIZE + 1}).status_code == 400
+
+
+def test_titles_ndjson(client, api):
+    # more than one page is streamed, with no limit on the number of titles
+    with client.stream("GET", "/titles", params={"format": "ndjson"}) as response:
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = list(response.iter_lines())
+    assert [json.loads(line)["title_id"] for line in lines] == [title_id(i) for i in range(NUMBER_TITLES)]
+
+    response = client.get("/titles", params={"format": "ndjson", "after": title_id(99), "limit": api.MAX_PAGE_SIZE + 5})
+    titles = [json.loads(line)["title_id"] for line in response.text.splitlines()]
+    assert titles == [title_id(i) for i in range(100, 100 + api.MAX_PAGE_SIZE + 5)]
+
+
+def test_search(client):
+    response = client.get("/search", params={"q": "synthetic title 1234"})
+    assert [entry["title_id"] for entry in response.json()["titles"]] == [title_id(1234)]
+    # the last word is a prefix, and offset pages through the matches
+    titles = client.get("/search", params={"q": "title 123", "limit": 100}).json()["titles"]
+    assert sorted(entry["title_id"] for entry in titles) == [title_id(123)] + [title_id(i) for i in range(1230, 1240)]
+    assert len(client.get("/search", params={"q": "title 123", "offset": 10}).json()["titles"]) == 1
+    assert client.get("/search", params={"q": "!!"}).json() == {"titles": []}
+
+
+def test_search_without_index(api, tmp_path, monkeypatch):
+    path = tmp_path / "titles.db"
+    make_synthetic_titles(path, 10)
+    monkeypatch.setattr(api.database, "database_path", path)
+    with TestClient(api.app) as client:
+        response = client.get("/search", params={"q": "title"})
+        assert response.status_code == 503
+        assert "build-search" in response.json()["detail"]
+        # picked up without restarting the app
+        build_search_index(path)
+        assert len(client.get("/search", params={"q": "title"}).json()["titles"]) == 10
+
+
+def test_strict_plans_without_search_index(tmp_path, caplog):
+    path = tmp_path / "titles.db"
+    make_synthetic_titles(path, 10)
+    # the search query can't be planned yet, which is not a scan of titles
+    assert prepare_database(path, strict=True) == []
+    assert "build-search" in caplog.text
+    build_search_index(path)
+    assert prepare_database(path, strict=True) == []
+    # a real scan still fails the strict check
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE titles_copy AS SELECT * FROM titles")
+    conn.execute("DROP TABLE titles")
+    conn.execute("ALTER TABLE titles_copy RENAME TO titles")
+    conn.close()
+    with pytest.raises(QueryPlanError):
+        prepare_database(path, strict=True)
+
+
+def test_cache_stats(client):
+    before = client.get("/cache/stats").json()
+    first = client.get(f"/titles/{title_id(7)}").json()
+    assert client.get(f"/titles/{title_id(7)}").json() == first
+    stats = client.get("/cache/stats").json()
+    assert stats["entries"] == 1
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (1, 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_response_cache_entry_limit():
+    cache = ResponseCache(max_entries=2, max_bytes=1000)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"  # b is now the least recently used
+    cache.set("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+    assert cache.stats() == {"entries": 2, "bytes": 2, "hits": 3, "misses": 1, "evictions": 1, "expirations": 0}
+
+
+def test_response_cache_byte_limit():
+    cache = ResponseCache(max_entries=10, max_bytes=10)
+    cache.set("a", b"x" * 4)
+    cache.set("b", b"x" * 4)
+    cache.set("c", b"x" * 4)
+    assert cache.get("a") is None
+    assert len(cache) == 2 and cache.size == 8
+    # values bigger than the whole cache are not cached, and sizes can be given for other values
+    cache.set("d", b"x" * 11)
+    assert cache.get("d") is None and len(cache) == 2
+    cache.set("e", {"title": "x"}, size=10)
+    assert len(cache) == 1 and cache.size == 10 and cache.evictions == 3
+
+
+def test_response_cache_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    cache.set("a", b"1")
+    cache.set("b", b"2", ttl=30)
+    clock.now = 9.9
+    assert cache.get("a") == b"1"
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("b") == b"2"
+    clock.now = 30
+    assert cache.get("b") is None
+    assert (cache.expirations, cache.hits, cache.misses, len(cache), cache.size) == (2, 2, 2, 0, 0)
+
+
+def test_response_cache_invalidate():
+    cache = ResponseCache()
+    cache.set("a", b"1")
+    cache.set("b", b"22")
+    cache.set("a", b"333")  # replacing a value doesn't count it twice
+    assert cache.size == 5
+    cache.invalidate("a")
+    assert cache.get("a") is None and cache.get("b") == b"22" and cache.size == 2
+    cache.invalidate()
+    assert len(cache) == 0 and cache.size == 0 and cache.get("b") is None
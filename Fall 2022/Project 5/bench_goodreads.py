@@ -0,0 +1,202 @@
+"""
+Benchmarks for the functions in `goodreads.py`, run against a synthetic
+goodreads-shaped `.json` lines file so they don't need access to Anvil.
+
+Usage:
+    python bench_goodreads.py [number_of_lines]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import goodreads
+
+
+def make_synthetic_books(path_to_json: str, number_lines: int, seed: int = 0) -> None:
+    """
+    Write `number_lines` goodreads-shaped book records to `path_to_json`.
+    """
+    rng = random.Random(seed)
+    with open(path_to_json, 'w') as f:
+        for i in range(number_lines):
+            book = {
+                'isbn': f'{rng.randrange(10**9):010d}',
+                'text_reviews_count': str(rng.randrange(500)),
+                'series': [],
+                'country_code': 'US',
+                'language_code': 'eng',
+                'popular_shelves': [{'count': str(rng.randrange(100)), 'name': 'to-read'}
+                                    for _ in range(rng.randrange(1, 6))],
+                'asin': '',
+                'is_ebook': 'false',
+                'average_rating': f'{rng.uniform(1, 5):.2f}',
+                'kindle_asin': '',
+                'similar_books': [str(rng.randrange(10**7)) for _ in range(5)],
+                'description': ' '.join(rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet'])
+                                        for _ in range(rng.randrange(20, 120))),
+                'format': 'Paperback',
+                'link': f'https://www.goodreads.com/book/show/{i}',
+                'authors': [{'author_id': str(rng.randrange(10**6)), 'role': ''}],
+                'publisher': 'Synthetic Press',
+                'num_pages': str(rng.randrange(50, 900)),
+                'publication_day': '', 'isbn13': f'978{rng.randrange(10**10):010d}',
+                'publication_month': '', 'edition_information': '',
+                'publication_year': str(rng.randrange(1900, 2018)),
+                'url': f'https://www.goodreads.com/book/show/{i}',
+                'image_url': f'https://images.gr-assets.com/books/{i}m/{i}.jpg',
+                'book_id': str(i), 'ratings_count': str(rng.randrange(10**4)),
+                'work_id': str(rng.randrange(10**7)),
+                'title': f'Synthetic Book {i}', 'title_without_series': f'Synthetic Book {i}',
+            }
+            f.write(json.dumps(book) + '\n')
+
+
+def make_synthetic_authors(path_to_json: str, number_authors: int, seed: int = 0) -> None:
+    """
+    Write `number_authors` goodreads-shaped author records to `path_to_json`.
+    """
+    rng = random.Random(seed)
+    syllables = ['an', 'bel', 'cor', 'dan', 'el', 'fin', 'gar', 'har', 'is', 'jo', 'kel', 'lin', 'mor', 'nas',
+                 'or', 'pet', 'ros', 'san', 'ter', 'vin', 'wil', 'son']
+    with open(path_to_json, 'w') as f:
+        for i in range(number_authors):
+            first = ''.join(rng.choice(syllables) for _ in range(rng.randrange(1, 3))).title()
+            last = ''.join(rng.choice(syllables) for _ in range(rng.randrange(2, 4))).title()
+            f.write(json.dumps({'average_rating': '4.00', 'author_id': str(i), 'text_reviews_count': '10',
+                                'name': f'{first} {last}', 'ratings_count': '100'}) + '\n')
+
+
+def _timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_split(path_to_json: str, number_files: int = 8) -> None:
+    """
+    Compare the line-counting splitter against the byte-range splitter.
+    """
+    size_mb = os.path.getsize(path_to_json) / 1e6
+    modes = {
+        'by lines': {},
+        'by bytes': {'by_bytes': True},
+        'by bytes, gzip': {'by_bytes': True, 'compress': True},
+    }
+    for label, kwargs in modes.items():
+        output_dir = tempfile.mkdtemp()
+        try:
+            seconds = _timed(goodreads.split_json_to_n_parts, path_to_json, number_files, output_dir, **kwargs)
+        finally:
+            shutil.rmtree(output_dir)
+        print(f'split_json_to_n_parts ({label}): {seconds:.3f}s, {size_mb / seconds:.1f} MB/s')
+
+
+def bench_isbn_lookup(path_to_json: str, number_lookups: int = 200) -> None:
+    """
+    Compare scanning for an isbn against the on-disk isbn index.
+    """
+    with open(path_to_json) as f:
+        isbns = [json.loads(line)['isbn'] for line in f]
+    sample = random.Random(1).sample(isbns, min(number_lookups, len(isbns)))
+    index_path = f'{path_to_json}.isbn.idx'
+    
+    seconds = _timed(goodreads.get_book_with_isbn, path_to_json, sample[-1])
+    print(f'get_book_with_isbn (scan, late match): {seconds * 1e3:.1f}ms')
+    seconds = _timed(goodreads.build_offset_index, path_to_json, index_path, goodreads._isbn_index_keys)
+    print(f'build_offset_index (isbn): {seconds:.3f}s')
+    seconds = _timed(lambda: [goodreads.get_book_with_isbn(path_to_json, isbn, index_path=index_path) for isbn in sample])
+    print(f'get_book_with_isbn (index): {len(sample) / seconds:.0f} lookups/s')
+    seconds = _timed(goodreads.get_books_with_isbns, path_to_json, sample, index_path=index_path)
+    print(f'get_books_with_isbns (index, batch of {len(sample)}): {len(sample) / seconds:.0f} lookups/s')
+
+
+def bench_scan(path_to_json: str) -> None:
+    """
+    Measure how `scan` scales with the number of worker processes.
+    """
+    from functools import partial
+    size_mb = os.path.getsize(path_to_json) / 1e6
+    predicate = partial(goodreads._field_equals, 'isbn', 'no such isbn')
+    chunk_size = max(1 << 20, os.path.getsize(path_to_json) // 64)
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        seconds = _timed(lambda: list(goodreads.scan(path_to_json, predicate, workers=workers, chunk_size=chunk_size)))
+        print(f'scan ({workers} workers): {seconds:.3f}s, {size_mb / seconds:.1f} MB/s')
+        workers *= 2
+
+
+def bench_prefilter(path_to_json: str) -> None:
+    """
+    Report lines per second for an isbn scan with and without the raw bytes
+    prefilter, using `orjson` if it is installed.
+    """
+    from functools import partial
+    with open(path_to_json, 'rb') as f:
+        number_lines = sum(1 for _ in f)
+    isbn = 'no such isbn'
+    predicate = partial(goodreads._field_equals, 'isbn', isbn)
+    decoder = 'orjson' if goodreads.orjson is not None else 'json'
+    for label, prefilter in [('no prefilter', None), ('prefilter', goodreads._json_needles(isbn))]:
+        seconds = _timed(lambda: list(goodreads.scan(path_to_json, predicate, workers=1, prefilter=prefilter)))
+        print(f'scan ({label}, {decoder}): {number_lines / seconds:.0f} lines/s')
+
+
+def bench_column_cache(path_to_json: str) -> None:
+    """
+    Compare reading a few fields by parsing the file against the column cache.
+    """
+    columns = ['isbn', 'title', 'average_rating', 'authors']
+    cache_dir = f'{path_to_json}.columns'
+    seconds = _timed(lambda: list(goodreads.read_columns(path_to_json, columns, cache_dir)))
+    print(f'read_columns (parse): {seconds:.3f}s')
+    seconds = _timed(goodreads.build_column_cache, path_to_json, cache_dir)
+    print(f'build_column_cache: {seconds:.3f}s')
+    seconds = _timed(lambda: list(goodreads.read_columns(path_to_json, columns, cache_dir)))
+    print(f'read_columns (cache): {seconds:.3f}s')
+    with open(path_to_json) as f:
+        isbn = json.loads(f.readlines()[-1])['isbn']
+    seconds = _timed(goodreads.get_book_with_isbn, path_to_json, isbn, workers=1, cache_dir=cache_dir)
+    print(f'get_book_with_isbn (cache, late match): {seconds * 1e3:.1f}ms')
+    shutil.rmtree(cache_dir)
+
+
+def bench_find_authors(path_to_author_data: str, number_queries: int = 100) -> None:
+    """
+    Time building the author name trigram index and fuzzy lookups against it.
+    """
+    with open(path_to_author_data) as f:
+        names = [json.loads(line)['name'] for line in f]
+    rng = random.Random(2)
+    queries = []
+    for name in rng.sample(names, min(number_queries, len(names))):
+        i = rng.randrange(len(name))
+        queries.append(name[:i] + name[i + 1:])  # drop one character
+    
+    seconds = _timed(goodreads.find_authors, path_to_author_data, queries[0])
+    print(f'find_authors (first call, builds index): {seconds:.3f}s')
+    seconds = _timed(lambda: [goodreads.find_authors(path_to_author_data, q) for q in queries])
+    print(f'find_authors: {seconds / len(queries) * 1e3:.2f}ms per lookup')
+
+
+if __name__ == '__main__':
+    number_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    work_dir = Path(tempfile.mkdtemp())
+    try:
+        books = work_dir / 'goodreads_books.json'
+        make_synthetic_books(books, number_lines)
+        bench_split(str(books))
+        bench_isbn_lookup(str(books))
+        bench_scan(str(books))
+        bench_prefilter(str(books))
+        bench_column_cache(str(books))
+        authors = work_dir / 'goodreads_book_authors.json'
+        make_synthetic_authors(authors, number_lines)
+        bench_find_authors(str(authors))
+    finally:
+        shutil.rmtree(work_dir)
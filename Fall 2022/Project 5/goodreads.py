@@ -1,15 +1,112 @@
 import os
+import sys
 from pathlib import Path
+import re
 import json
+import gzip
+import mmap
+import struct
+import pickle
+import unicodedata
+from array import array
+from bisect import bisect_right
+from difflib import SequenceMatcher
 import shutil
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from itertools import repeat
 import uuid
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import hashlib
 import pytest
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-def split_json_to_n_parts(path_to_json: str, number_files: int, output_dir: str) -> None:
+
+COPY_BUFFER_SIZE = 1024 * 1024
+GZIP_LEVEL = 6
+
+
+# map every digit to b'0' so a run of 19 digits can be found with a plain substring search
+_DIGITS_TO_ZERO = bytes.maketrans(b'123456789', b'000000000')
+_LONG_DIGITS = b'0' * 19
+
+
+def _loads(line):
+    """
+    Decode one JSON line, with `orjson` when it is installed. Lines `orjson`
+    rejects (NaN, lone surrogates, ...) or could decode differently (integers
+    too big for 64 bits) fall back to `json` so results never differ from
+    `json.loads`.
+    """
+    if orjson is not None and _LONG_DIGITS not in bytes(line).translate(_DIGITS_TO_ZERO):
+        try:
+            return orjson.loads(line)
+        except ValueError:
+            pass
+    return json.loads(line)
+
+
+def _json_needles(value) -> list:
+    """
+    The byte strings one of which must appear in any raw JSON line containing
+    `value`, or None when `value` could have been written in more than one
+    way (escapes, non-ASCII text) and no safe prefilter exists.
+    """
+    if isinstance(value, str) and any(not (0x20 <= ord(c) < 0x7f) or c in '"\\/<>&' for c in value):
+        return None
+    return [json.dumps(value).encode('utf-8')]
+
+
+def _newline_aligned_ranges(path_to_json: Path, number_parts: int) -> list:
+    """
+    Split the file at `path_to_json` into at most `number_parts` byte ranges
+    of roughly equal size. Every range starts at the beginning of a line and
+    ends just after a newline (or at the end of the file), so no JSON line is
+    ever cut in half. Empty ranges are dropped.
+    """
+    file_size = os.path.getsize(path_to_json)
+    boundaries = [0]
+    with open(path_to_json, 'rb') as f:
+        for part in range(1, number_parts):
+            target = max(file_size * part // number_parts, boundaries[-1], 1)
+            if target >= file_size:
+                break
+            # move forward to the start of the line at or after `target`
+            f.seek(target - 1)
+            f.readline()
+            boundaries.append(f.tell())
+    boundaries.append(file_size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def _copy_byte_range(path_to_json: Path, start: int, end: int, output_file: Path, compress: bool) -> int:
+    """
+    Copy the bytes in [`start`, `end`) of `path_to_json` to `output_file`,
+    gzipping them if `compress` is True. Returns the number of bytes copied.
+    """
+    remaining = end - start
+    dst = gzip.open(output_file, 'wb', compresslevel=GZIP_LEVEL) if compress else open(output_file, 'wb')
+    with open(path_to_json, 'rb') as src, dst:
+        src.seek(start)
+        while remaining > 0:
+            chunk = src.read(min(COPY_BUFFER_SIZE, remaining))
+            if not chunk:
+                break
+            dst.write(chunk)
+            remaining -= len(chunk)
+    return end - start - remaining
+
+
+def split_json_to_n_parts(path_to_json: str, number_files: int, output_dir: str,
+                          by_bytes: bool = False, workers: int = None, compress: bool = False) -> None:
     """
     Given a str representing the absolute path to a `.json` file, 
     `split_json` will split it into `number_files` `.json` files of equal size.
@@ -19,6 +116,13 @@ def split_json_to_n_parts(path_to_json: str, number_files: int, output_dir: str)
         number_files: The number of files to split the `.json` file into.
         output_dir: The absolute path to the directory where the split `.json` 
             files are to be output.
+        by_bytes: Whether to split on byte offsets aligned to newline boundaries
+            (True) instead of counting lines first (False). Byte splitting reads
+            the file only once and writes the parts concurrently. Default False.
+        workers: The number of threads used to write the parts when `by_bytes`
+            is True. Defaults to one thread per part.
+        compress: Whether to gzip the parts, which are then named
+            `<stem>_<n>.json.gz`. Default False.
 
     Returns:
         Nothing.
@@ -80,8 +184,34 @@ def split_json_to_n_parts(path_to_json: str, number_files: int, output_dir: str)
         >>> shutil.rmtree(output_dir)
         >>> print(type(result)) # doctest: +NORMALIZE_WHITESPACE
         <class 'str'>
+        
+        Splitting on byte offsets gives back the same lines, in the same order
+        >>> test_json = '/anvil/projects/tdm/data/goodreads/test.json'
+        >>> output_dir = f'{os.getenv("SCRATCH")}/p5testoutput'
+        >>> os.mkdir(output_dir)
+        >>> split_json_to_n_parts(test_json, 2, output_dir, by_bytes=True)
+        >>> lines = []
+        >>> for part_num in range(2):
+        ...     file = Path(output_dir) / f'{Path(test_json).stem}_{part_num}.json'
+        ...     with open(file, 'r') as p:
+        ...         lines.extend(p.readlines())
+        >>> shutil.rmtree(output_dir)
+        >>> lines == open(test_json).readlines()
+        True
     """
     path_to_json = Path(path_to_json)
+    suffix = '.json.gz' if compress else '.json'
+    
+    if by_bytes:
+        ranges = _newline_aligned_ranges(path_to_json, number_files)
+        with ThreadPoolExecutor(max_workers=workers or max(len(ranges), 1)) as pool:
+            futures = [pool.submit(_copy_byte_range, path_to_json, start, end,
+                                   Path(output_dir) / f'{path_to_json.stem}_{part_number}{suffix}', compress)
+                       for part_number, (start, end) in enumerate(ranges)]
+            for future in futures:
+                future.result()
+        return
+    
     num_lines = sum(1 for _ in open(path_to_json))
     group_amount = num_lines//number_files + 1
     with open(path_to_json, 'r') as f:
@@ -92,14 +222,480 @@ def split_json_to_n_parts(path_to_json: str, number_files: int, output_dir: str)
                 if writer:  
                     writer.close()
                     
-                writer = open(str(Path(output_dir) / f'{path_to_json.stem}_{part_number}.json'), 'w')
+                output_file = str(Path(output_dir) / f'{path_to_json.stem}_{part_number}{suffix}')
+                writer = gzip.open(output_file, 'wt', compresslevel=GZIP_LEVEL) if compress else open(output_file, 'w')
                 part_number += 1
                 
             writer.write(line)
+        
+        if writer:
+            writer.close()
             
             
             
-def get_book_with_isbn(path_to_json: str, isbn: str) -> dict:
+INDEX_MAGIC = b'GRIDX001'
+INDEX_HEADER = struct.Struct('>8sQQQ')
+INDEX_RECORD = struct.Struct('>QQQ')
+ISBN_INDEX_FIELDS = ('isbn', 'isbn13', 'book_id')
+
+_open_indexes = {}
+
+
+def _index_key_hash(key: str) -> int:
+    """
+    Hash an index key such as `'isbn:0312853122'` down to 64 bits.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _isbn_index_keys(d: dict) -> list:
+    """
+    The keys a book is stored under in the ISBN index.
+    """
+    return [f'{field}:{d.get(field)}' for field in ISBN_INDEX_FIELDS if d.get(field)]
+
+
+def build_offset_index(path_to_json: str, index_path: str, keys_for_record) -> None:
+    """
+    Given a str representing the absolute path to a `.json` lines file,
+    `build_offset_index` writes an index file to `index_path` that maps every
+    key returned by `keys_for_record(d)` to the byte offset and length of the
+    line `d` was parsed from.
+    
+    The index is a 32 byte header (magic, source size, source mtime) followed
+    by fixed width (key hash, offset, length) records sorted by key hash, so a
+    lookup is a binary search over a memory-mapped file.
+    
+    Args:
+        path_to_json: The absolute path to the `.json` file.
+        index_path: The absolute path of the index file to write.
+        keys_for_record: A function taking a parsed line and returning the
+            keys (str) it should be found under.
+
+    Returns:
+        Nothing.
+    """
+    path_to_json = Path(path_to_json)
+    index_path = Path(index_path)
+    stat = os.stat(path_to_json)
+    records = []
+    offset = 0
+    with open(path_to_json, 'rb') as f:
+        for line in f:
+            if line.strip():
+                for key in keys_for_record(_loads(line)):
+                    records.append(INDEX_RECORD.pack(_index_key_hash(key), offset, len(line)))
+            offset += len(line)
+    
+    # records are packed big-endian, so sorting the bytes sorts by key hash
+    records.sort()
+    tmp_path = index_path.with_name(f'{index_path.name}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(records)))
+        f.write(b''.join(records))
+    os.replace(tmp_path, index_path)
+    stale = _open_indexes.pop(str(index_path), None)
+    if stale:
+        stale[0].close()
+
+
+def _open_offset_index(path_to_json: str, index_path: str, keys_for_record) -> mmap.mmap:
+    """
+    Return the memory-mapped index at `index_path`, (re)building it first if it
+    is missing or was built from a different version of `path_to_json`.
+    """
+    stat = os.stat(path_to_json)
+    index_path = str(index_path)
+    cached = _open_indexes.get(index_path)
+    if cached and cached[1] == (stat.st_size, stat.st_mtime_ns):
+        return cached[0]
+    
+    for attempt in range(2):
+        try:
+            with open(index_path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            mm = None
+        if mm is not None and len(mm) >= INDEX_HEADER.size:
+            magic, size, mtime_ns, count = INDEX_HEADER.unpack_from(mm)
+            if (magic, size, mtime_ns) == (INDEX_MAGIC, stat.st_size, stat.st_mtime_ns) \
+                    and len(mm) == INDEX_HEADER.size + count * INDEX_RECORD.size:
+                _open_indexes[index_path] = (mm, (stat.st_size, stat.st_mtime_ns))
+                return mm
+        if mm is not None:
+            mm.close()
+        build_offset_index(path_to_json, index_path, keys_for_record)
+    raise RuntimeError(f'Could not build a usable index at {index_path}')
+
+
+def _lookup_offsets(mm: mmap.mmap, key: str) -> list:
+    """
+    Binary search the index `mm` for `key` and return the (offset, length)
+    of every line stored under its hash.
+    """
+    key_hash = _index_key_hash(key)
+    count = INDEX_HEADER.unpack_from(mm)[3]
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if INDEX_RECORD.unpack_from(mm, INDEX_HEADER.size + mid * INDEX_RECORD.size)[0] < key_hash:
+            lo = mid + 1
+        else:
+            hi = mid
+    
+    matches = []
+    while lo < count:
+        record_hash, offset, length = INDEX_RECORD.unpack_from(mm, INDEX_HEADER.size + lo * INDEX_RECORD.size)
+        if record_hash != key_hash:
+            break
+        matches.append((offset, length))
+        lo += 1
+    return matches
+
+
+def _default_index_path(path_to_json: str, kind: str) -> Path:
+    return Path(f'{path_to_json}.{kind}.idx')
+
+
+SCAN_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def _scan_range(path_to_json: Path, start: int, end: int, predicate, fields, prefilter=None) -> list:
+    """
+    Parse the lines in [`start`, `end`) of `path_to_json` and return the ones
+    `predicate` accepts, projected down to `fields`. Lines containing none of
+    the `prefilter` byte strings are skipped without being decoded. Runs
+    inside the workers of `scan`.
+    """
+    matches = []
+    with open(path_to_json, 'rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if position >= end:
+                break
+            position += len(line)
+            if prefilter is not None and not any(needle in line for needle in prefilter):
+                continue
+            if not line.strip():
+                continue
+            d = _loads(line)
+            if predicate(d):
+                matches.append(d if fields is None else {field: d.get(field) for field in fields})
+    return matches
+
+
+def scan(path_to_json: str, predicate, fields: list = None, workers: int = None, chunk_size: int = SCAN_CHUNK_SIZE,
+         prefilter: list = None):
+    """
+    Given a str representing the absolute path to a `.json` lines file and a
+    predicate, `scan` will yield every parsed line for which `predicate`
+    returns True, in file order.
+    
+    The file is cut into newline-aligned byte ranges of about `chunk_size`
+    bytes which are parsed, filtered and projected in a process pool, so
+    `predicate` must be picklable (a module level function or a
+    `functools.partial` of one, not a lambda).
+    
+    Args:
+        path_to_json: The absolute path to the `.json` file.
+        predicate: A function taking the `dict` for one line and returning
+            whether it should be yielded.
+        fields: The keys to keep from each match. Default None keeps them all.
+        workers: The number of processes to use. Defaults to `os.cpu_count()`.
+            With 1 worker, or a file smaller than `chunk_size`, the scan
+            runs in the calling process.
+        chunk_size: The approximate number of bytes handed to a worker at a time.
+        prefilter: A list of byte strings. Lines whose raw bytes contain none
+            of them are rejected before being decoded, so every line the
+            `predicate` could accept must contain at least one. Default None
+            decodes every line.
+
+    Returns:
+        A generator of `dict`.
+        
+    Examples:
+    
+        >>> from functools import partial
+        >>> matches = scan('/anvil/projects/tdm/data/goodreads/goodreads_books.json',
+        ...                partial(_field_equals, 'isbn', '0312853122'), fields=['title'])
+        >>> next(matches)
+        {'title': 'W.C. Fields: A Life on Film'}
+    """
+    path_to_json = Path(path_to_json)
+    workers = workers or os.cpu_count() or 1
+    number_parts = max(1, -(-os.path.getsize(path_to_json) // chunk_size))
+    ranges = _newline_aligned_ranges(path_to_json, number_parts)
+    
+    if workers == 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield from _scan_range(path_to_json, start, end, predicate, fields, prefilter)
+        return
+    
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(ranges)))
+    try:
+        results = pool.map(_scan_range, repeat(path_to_json), [start for start, _ in ranges],
+                           [end for _, end in ranges], repeat(predicate), repeat(fields), repeat(prefilter))
+        for matches in results:
+            yield from matches
+    finally:
+        # stop handing out ranges if the caller stopped early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _book_author_ids(d: dict) -> set:
+    return {author.get('author_id') for author in d.get('authors') or []}
+
+
+def _field_equals(field: str, value, d: dict) -> bool:
+    return d.get(field) == value
+
+
+def _has_any_author(author_ids: frozenset, d: dict) -> bool:
+    return not author_ids.isdisjoint(_book_author_ids(d))
+
+
+COLUMN_CACHE_VERSION = 1
+COLUMN_FLUSH_ROWS = 65536
+# every cell in a column heap starts with one of these tags; an empty cell means the key was missing
+CELL_STR = b's'
+CELL_JSON = b'j'
+
+
+def _default_column_cache_dir(path_to_json: str) -> Path:
+    return Path(f'{path_to_json}.columns')
+
+
+def _encode_cell(value) -> bytes:
+    if isinstance(value, str):
+        return CELL_STR + value.encode('utf-8', 'surrogatepass')
+    return CELL_JSON + json.dumps(value).encode('utf-8')
+
+
+def _decode_cell(cell: bytes):
+    if cell[:1] == CELL_STR:
+        return bytes(cell[1:]).decode('utf-8', 'surrogatepass')
+    return _loads(bytes(cell[1:]))
+
+
+def build_column_cache(path_to_json: str, cache_dir: str = None) -> None:
+    """
+    Given a str representing the absolute path to a `.json` lines file,
+    `build_column_cache` converts it, once, into a columnar cache in
+    `cache_dir`. Every key found in the file becomes a column made of a heap
+    of encoded values and an array of offsets into that heap, so readers
+    can memory-map just the columns they need instead of parsing every line.
+    
+    Args:
+        path_to_json: The absolute path to the `.json` file.
+        cache_dir: The directory to write the cache to. Defaults to
+            `<path_to_json>.columns`.
+
+    Returns:
+        Nothing.
+        
+    Examples:
+    
+        >>> test_json = '/anvil/projects/tdm/data/goodreads/test.json'
+        >>> cache_dir = f'{os.getenv("SCRATCH")}/test.columns'
+        >>> build_column_cache(test_json, cache_dir)
+        >>> first_title = ColumnCache(cache_dir).column('title')[0]
+        >>> # cleanup
+        >>> shutil.rmtree(cache_dir)
+        >>> first_title == json.loads(open(test_json).readline())['title']
+        True
+    """
+    path_to_json = Path(path_to_json)
+    cache_dir = Path(cache_dir or _default_column_cache_dir(path_to_json))
+    stat = os.stat(path_to_json)
+    tmp_dir = cache_dir.with_name(f'{cache_dir.name}.{uuid.uuid4().hex}.tmp')
+    tmp_dir.mkdir(parents=True)
+    
+    columns = {}  # name -> [heap file, offsets file, heap size, pending offsets]
+    rows = 0
+    
+    def flush(column):
+        column[1].write(column[3].tobytes())
+        del column[3][:]
+    
+    try:
+        with open(path_to_json, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                d = _loads(line)
+                for name in d:
+                    if name not in columns:
+                        number = len(columns)
+                        column = [open(tmp_dir / f'{number}.heap', 'wb'), open(tmp_dir / f'{number}.offsets', 'wb'),
+                                  0, array('Q')]
+                        # a new key: the heap starts at 0 and every earlier row is missing it
+                        column[1].write(bytes(column[3].itemsize * (rows + 1)))
+                        columns[name] = column
+                for name, column in columns.items():
+                    if name in d:
+                        cell = _encode_cell(d[name])
+                        column[0].write(cell)
+                        column[2] += len(cell)
+                    column[3].append(column[2])
+                    if len(column[3]) >= COLUMN_FLUSH_ROWS:
+                        flush(column)
+                rows += 1
+        for column in columns.values():
+            flush(column)
+    finally:
+        for column in columns.values():
+            column[0].close()
+            column[1].close()
+    
+    with open(tmp_dir / 'manifest.json', 'w') as m:
+        json.dump({'version': COLUMN_CACHE_VERSION, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns,
+                   'rows': rows, 'byteorder': sys.byteorder, 'columns': list(columns)}, m)
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    os.replace(tmp_dir, cache_dir)
+
+
+class _Column:
+    """
+    One memory-mapped column of a `ColumnCache`; indexing it decodes a single cell.
+    """
+    
+    def __init__(self, offsets: memoryview, heap: mmap.mmap):
+        self.offsets = offsets
+        self.heap = heap
+        
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def raw(self, row: int) -> bytes:
+        """
+        The encoded cell for `row`: a type tag followed by the value, or b'' if missing.
+        """
+        return self.heap[self.offsets[row]:self.offsets[row + 1]]
+    
+    def __getitem__(self, row: int):
+        cell = self.raw(row)
+        return _decode_cell(cell) if cell else None
+    
+    def rows_containing(self, needle: bytes):
+        """
+        Yield, in order, every row whose encoded cell contains `needle`,
+        searching the heap directly instead of decoding each cell.
+        """
+        last_row = -1
+        position = self.heap.find(needle)
+        while position != -1:
+            row = bisect_right(self.offsets, position) - 1
+            if row != last_row:
+                yield row
+                last_row = row
+            position = self.heap.find(needle, position + 1)
+
+
+class ColumnCache:
+    """
+    A columnar cache written by `build_column_cache`. Columns are only opened,
+    and memory-mapped, the first time they are asked for.
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / 'manifest.json') as m:
+            self.manifest = json.load(m)
+        if self.manifest.get('version') != COLUMN_CACHE_VERSION or self.manifest['byteorder'] != sys.byteorder:
+            raise ValueError(f'Unsupported column cache in {cache_dir}')
+        self.rows = self.manifest['rows']
+        self.columns = self.manifest['columns']
+        self._open = {}
+        
+    def is_fresh(self, path_to_json: str) -> bool:
+        """
+        Whether the cache was built from the current version of `path_to_json`.
+        """
+        stat = os.stat(path_to_json)
+        return (self.manifest['source_size'], self.manifest['source_mtime_ns']) == (stat.st_size, stat.st_mtime_ns)
+        
+    def column(self, name: str) -> _Column:
+        if name not in self._open:
+            if name not in self.columns:
+                self._open[name] = None
+            else:
+                number = self.columns.index(name)
+                self._open[name] = _Column(memoryview(self._mmap(f'{number}.offsets')).cast('Q'),
+                                           self._mmap(f'{number}.heap'))
+        return self._open[name]
+    
+    def row(self, row: int, columns: list = None) -> dict:
+        """
+        Rebuild the `dict` for `row`, keeping only `columns` if given.
+        """
+        d = {}
+        for name in columns or self.columns:
+            column = self.column(name)
+            cell = column.raw(row) if column is not None else b''
+            if cell:
+                d[name] = _decode_cell(cell)
+        return d
+    
+    def _mmap(self, filename: str):
+        with open(self.cache_dir / filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _fresh_column_cache(path_to_json: str, cache_dir: str = None):
+    """
+    Return the `ColumnCache` for `path_to_json` if one exists and is up to
+    date with the file, else None.
+    """
+    cache_dir = Path(cache_dir or _default_column_cache_dir(path_to_json))
+    if not (cache_dir / 'manifest.json').exists():
+        return None
+    try:
+        cache = ColumnCache(cache_dir)
+    except (ValueError, KeyError, OSError):
+        return None
+    return cache if cache.is_fresh(path_to_json) else None
+
+
+def read_columns(path_to_json: str, columns: list, cache_dir: str = None):
+    """
+    Given a str representing the absolute path to a `.json` lines file and a
+    list of keys, `read_columns` yields a `dict` holding just those keys for
+    every line. A fresh column cache is used when there is one, so only the
+    requested columns are read; otherwise the file is parsed.
+    
+    Args:
+        path_to_json: The absolute path to the `.json` file.
+        columns: The keys of interest.
+        cache_dir: Where the column cache lives. Defaults to `<path_to_json>.columns`.
+
+    Returns:
+        A generator of `dict`.
+        
+    Examples:
+    
+        >>> rows = read_columns('/anvil/projects/tdm/data/goodreads/goodreads_books.json', ['isbn', 'average_rating'])
+        >>> next(rows)
+        {'isbn': '0312853122', 'average_rating': '4.00'}
+    """
+    cache = _fresh_column_cache(path_to_json, cache_dir)
+    if cache is None:
+        with open(path_to_json, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    d = _loads(line)
+                    yield {name: d[name] for name in columns if name in d}
+        return
+    
+    for row in range(cache.rows):
+        yield cache.row(row, columns)
+
+
+def get_book_with_isbn(path_to_json: str, isbn: str, use_index: bool = False, index_path: str = None,
+                       workers: int = None, cache_dir: str = None) -> dict:
     """
     Given a str representing the absolute path to a `.json` file, 
     `get_book_with_isbn` will return a `dict` containing the rest of
@@ -108,6 +704,16 @@ def get_book_with_isbn(path_to_json: str, isbn: str) -> dict:
     Args:
         path_to_json: The absolute path to the `.json` file.
         isbn: The isbn of the book of interest.
+        use_index: Whether to look the isbn up in an on-disk index instead of
+            scanning the file. The index is built on first use and rebuilt
+            whenever the `.json` file's size or mtime changes. Default False.
+        index_path: Where to keep the index. Defaults to `<path_to_json>.isbn.idx`.
+            Giving an `index_path` implies `use_index`.
+        workers: The number of processes used to scan the file, see `scan`.
+        cache_dir: Where to look for a column cache written by `build_column_cache`.
+            Defaults to `<path_to_json>.columns`. When a cache built from the
+            current version of the file is found, it is searched instead of
+            the file.
 
     Returns:
         A `dict` containing the rest of the data, or `None` if no
@@ -135,17 +741,287 @@ def get_book_with_isbn(path_to_json: str, isbn: str) -> dict:
         >>> get_book_with_isbn('/anvil/projects/tdm/data/goodreads/goodreads_books.json', '1408882280').get('title')
         'Harry Potter and the Half-Blood Prince (Harry Potter 6)'
         
+        >>> index_path = f'{os.getenv("SCRATCH")}/goodreads_books.isbn.idx'
+        >>> title = get_book_with_isbn('/anvil/projects/tdm/data/goodreads/goodreads_books.json', '0312853122', index_path=index_path).get('title')
+        >>> # cleanup
+        >>> os.remove(index_path)
+        >>> title
+        'W.C. Fields: A Life on Film'
    
     """
     path_to_json = Path(path_to_json)
-    with open(path_to_json, 'r') as f:
-        for line in f:
-            d = json.loads(line)
-            if isbn == d.get('isbn'):
-                return d
+    if use_index or index_path:
+        return get_books_with_isbns(path_to_json, [isbn], index_path=index_path)[isbn]
+    
+    cache = _fresh_column_cache(path_to_json, cache_dir)
+    if cache is not None and isinstance(isbn, str):
+        column = cache.column('isbn')
+        target = _encode_cell(isbn)
+        for row in column.rows_containing(target) if column is not None else ():
+            if column.raw(row) == target:
+                return cache.row(row)
+        return None
+    
+    matches = scan(path_to_json, partial(_field_equals, 'isbn', isbn), workers=workers,
+                   prefilter=_json_needles(isbn))
+    try:
+        return next(matches, None)
+    finally:
+        matches.close()
+
+
+def get_books_with_isbns(path_to_json: str, isbns: list, field: str = 'isbn', index_path: str = None) -> dict:
+    """
+    Given a str representing the absolute path to a `.json` file and a list
+    of isbns, `get_books_with_isbns` will return a `dict` mapping each isbn to
+    the data on that book, using the on-disk index described in
+    `get_book_with_isbn`. The matching lines are read in file order, so many
+    lookups share one mostly sequential pass over the file.
+    
+    Args:
+        path_to_json: The absolute path to the `.json` file.
+        isbns: The isbns (or isbn13s or book ids, see `field`) of interest.
+        field: Which field to look up, one of 'isbn', 'isbn13' or 'book_id'.
+            Default 'isbn'.
+        index_path: Where to keep the index. Defaults to `<path_to_json>.isbn.idx`.
+
+    Returns:
+        A `dict` mapping every requested isbn to a `dict` with the book's data,
+        or to `None` if no book with that isbn was found.
         
+    Examples:
+    
+        >>> index_path = f'{os.getenv("SCRATCH")}/goodreads_books.isbns.idx'
+        >>> books = get_books_with_isbns('/anvil/projects/tdm/data/goodreads/goodreads_books.json', ['0312853122', '1408882280'], index_path=index_path)
+        >>> # cleanup
+        >>> os.remove(index_path)
+        >>> books['1408882280'].get('kindle_asin')
+        'B0192CTMWI'
+    """
+    if field not in ISBN_INDEX_FIELDS:
+        raise ValueError(f"field must be one of {ISBN_INDEX_FIELDS}, not {field!r}")
+    
+    path_to_json = Path(path_to_json)
+    index_path = index_path or _default_index_path(path_to_json, 'isbn')
+    mm = _open_offset_index(path_to_json, index_path, _isbn_index_keys)
+    
+    books = {isbn: None for isbn in isbns}
+    wanted = sorted((offset, length, isbn) for isbn in books
+                    for offset, length in _lookup_offsets(mm, f'{field}:{isbn}'))
+    with open(path_to_json, 'rb') as f:
+        for offset, length, isbn in wanted:
+            if books[isbn] is not None:
+                continue
+            f.seek(offset)
+            d = _loads(f.read(length))
+            # guard against 64 bit hash collisions
+            if d.get(field) == isbn:
+                books[isbn] = d
+    return books
         
-def get_books_by_author_name(path_to_book_data: str, path_to_author_data: str, name: str, ) -> dict:
+        
+FUZZY_MIN_SCORE = 80
+FUZZY_CANDIDATES = 50
+
+_author_name_indexes = {}
+
+_NOT_ALNUM = re.compile(r'[\W_]+')
+
+
+def _normalize_name(name: str) -> str:
+    """
+    Lowercase `name`, strip accents and collapse punctuation and whitespace,
+    so 'J.K. Rowling' and 'j k  rowling' normalize the same way.
+    """
+    name = name or ''
+    if not name.isascii():
+        name = unicodedata.normalize('NFKD', name)
+        name = ''.join(c for c in name if not unicodedata.combining(c))
+    return _NOT_ALNUM.sub(' ', name.lower()).strip()
+
+
+def _trigrams(normalized_name: str) -> set:
+    padded = f'  {normalized_name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_key(gram: str) -> int:
+    """
+    Pack a trigram into one int, 21 bits per code point, the same way
+    `AuthorNameIndex` does for every name at once.
+    """
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+
+class AuthorNameIndex:
+    """
+    A character trigram inverted index over the author names in
+    `goodreads_book_authors.json`, used by `find_authors` to narrow a fuzzy
+    name search down to a few candidates before scoring them.
+    """
+    
+    def __init__(self, path_to_author_data: str):
+        stat = os.stat(path_to_author_data)
+        self.source = (stat.st_size, stat.st_mtime_ns)
+        self.names = []       # normalized name -> position in this list
+        self.display = []     # first spelling seen for each normalized name
+        self.author_ids = []  # author ids for each normalized name
+        positions = {}
+        with open(path_to_author_data, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                d = _loads(line)
+                normalized = _normalize_name(d.get('name'))
+                if not normalized:
+                    continue
+                position = positions.get(normalized)
+                if position is None:
+                    position = positions[normalized] = len(self.names)
+                    self.names.append(normalized)
+                    self.display.append(d.get('name'))
+                    self.author_ids.append([])
+                self.author_ids[position].append(d.get('author_id'))
+        self._build_postings()
+    
+    def _build_postings(self) -> None:
+        """
+        Compute the trigrams of every name with numpy rather than one at a
+        time: pack each into an int (see `_trigram_key`), drop repeats within
+        a name, and group the name positions by trigram so the postings of the
+        trigram `gram_keys[g]` are `postings[offsets[g]:offsets[g + 1]]`.
+        """
+        padded = [f'  {name} ' for name in self.names]
+        lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+        code_points = np.frombuffer(''.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        grams_per_name = lengths - 2
+        owner = np.repeat(np.arange(len(padded), dtype=np.uint32), grams_per_name)
+        first_gram = np.repeat(np.cumsum(lengths) - lengths - (np.cumsum(grams_per_name) - grams_per_name),
+                               grams_per_name)
+        start = first_gram + np.arange(len(owner))
+        keys = (code_points[start] << 42) | (code_points[start + 1] << 21) | code_points[start + 2]
+        
+        # a stable sort by trigram keeps each trigram's names in order, so
+        # repeats within a name end up next to each other
+        order = np.argsort(keys, kind='stable')
+        owner, keys = owner[order], keys[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (owner[1:] != owner[:-1])
+        owner, keys = owner[keep], keys[keep]
+        
+        new_gram = np.ones(len(keys), dtype=bool)
+        new_gram[1:] = keys[1:] != keys[:-1]
+        self.gram_keys = keys[new_gram]
+        self.offsets = np.append(np.flatnonzero(new_gram), len(keys))
+        self.postings = owner
+        self.sizes = np.minimum(np.bincount(owner, minlength=len(padded)), 0xFFFF).astype(np.uint16)
+    
+    def is_fresh(self, path_to_author_data: str) -> bool:
+        stat = os.stat(path_to_author_data)
+        return self.source == (stat.st_size, stat.st_mtime_ns)
+    
+    def search(self, name: str, limit: int = 10, min_score: float = FUZZY_MIN_SCORE) -> list:
+        """
+        Return up to `limit` matches for `name`, best first, as `dict` with the
+        matched `name`, its `author_ids` and a 0-100 `score`.
+        """
+        normalized = _normalize_name(name)
+        grams = _trigrams(normalized)
+        if not grams or not len(self.gram_keys):
+            return []
+        keys = np.array([_trigram_key(gram) for gram in grams], dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.gram_keys, keys), len(self.gram_keys) - 1)
+        found = found[self.gram_keys[found] == keys]
+        slices = [self.postings[self.offsets[g]:self.offsets[g + 1]] for g in found.tolist()]
+        if not slices:
+            return []
+        shared = np.bincount(np.concatenate(slices), minlength=len(self.names))
+        
+        # rank the names sharing any trigram by overlap (Dice coefficient),
+        # then score only the best few properly
+        number_candidates = max(FUZZY_CANDIDATES, limit)
+        sharing = np.flatnonzero(shared)
+        dice = 2 * shared[sharing] / (len(grams) + self.sizes[sharing])
+        if len(sharing) > number_candidates:
+            best = np.argpartition(-dice, number_candidates)[:number_candidates]
+            sharing, dice = sharing[best], dice[best]
+        candidates = sharing[np.argsort(-dice, kind='stable')].tolist()
+        matches = []
+        for position in candidates:
+            score = round(100 * SequenceMatcher(None, normalized, self.names[position]).ratio(), 1)
+            if score >= min_score:
+                matches.append({'name': self.display[position], 'author_ids': list(self.author_ids[position]),
+                                'score': score})
+        matches.sort(key=lambda m: -m['score'])
+        return matches[:limit]
+
+
+def _author_name_index(path_to_author_data: str, index_path: str = None) -> AuthorNameIndex:
+    """
+    Return an up to date `AuthorNameIndex` for `path_to_author_data`, kept in
+    memory between calls and, if `index_path` is given, pickled to disk.
+    """
+    key = str(Path(path_to_author_data).resolve())
+    index = _author_name_indexes.get(key)
+    if index is not None and index.is_fresh(path_to_author_data):
+        return index
+    
+    index = None
+    if index_path and os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            index = pickle.load(f)
+        if not index.is_fresh(path_to_author_data):
+            index = None
+    if index is None:
+        index = AuthorNameIndex(path_to_author_data)
+        if index_path:
+            tmp_path = f'{index_path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, index_path)
+    _author_name_indexes[key] = index
+    return index
+
+
+def find_authors(path_to_author_data: str, name: str, limit: int = 10, min_score: float = FUZZY_MIN_SCORE,
+                 index_path: str = None) -> list:
+    """
+    Given a str representing the absolute path to the `goodreads_book_authors.json`
+    file and a name, `find_authors` will return the author names that roughly
+    match it, best first.
+    
+    The first call builds a trigram index of every author name, which later
+    calls reuse, so a lookup only scores a few dozen candidates.
+    
+    Args:
+        path_to_author_data: The absolute path to the `goodreads_book_authors.json` file.
+        name: The (possibly misspelled) name of the author of interest.
+        limit: The maximum number of matches to return. Default 10.
+        min_score: The lowest score, out of 100, a match may have. Default 80.
+        index_path: Where to pickle the trigram index so other processes can
+            reuse it. Default None keeps it in memory only.
+
+    Returns:
+        A list of `dict`, each with the matched `name`, its `author_ids` and its `score`.
+        
+    Examples:
+    
+        >>> find_authors('/anvil/projects/tdm/data/goodreads/goodreads_book_authors.json', 'brandon sandersen')[0]['name']
+        'Brandon Sanderson'
+    """
+    return _author_name_index(path_to_author_data, index_path).search(name, limit, min_score)
+
+
+def _author_index_keys(d: dict) -> list:
+    """
+    The keys a book is stored under in the author index.
+    """
+    return [f"author_id:{author.get('author_id')}" for author in d.get('authors') or []]
+
+
+def get_books_by_author_name(path_to_book_data: str, path_to_author_data: str, name, fuzzy: bool = False,
+                             use_index: bool = False, index_path: str = None, workers: int = None,
+                             cache_dir: str = None):
     """
     Given a str representing the absolute path to the `goodreads_books.json` file, the 
     absolute path to the `goodreads_book_authors.json` file, and a name,
@@ -155,13 +1031,26 @@ def get_books_by_author_name(path_to_book_data: str, path_to_author_data: str, n
     Args:
         path_to_book_data: The absolute path to the `goodreads_books.json` file.
         path_to_author_data: The absolute path to the `goodreads_book_authors.json` file.
-        name: The name of the author of interest.
+        name: The name of the author of interest, or a list of names to look up
+            in one pass over the data.
         fuzzy: Whether or not we get a rough match to the author name (True) or an 
-            exact match (False). Default false.
+            exact match (False). Default false. Rough matches are found with
+            `find_authors`, and the works of the best scoring author are returned
+            (of every author tied for the best score, if several are).
+        use_index: Whether to find the books through an on-disk author_id to
+            book offset index instead of scanning `goodreads_books.json`. The
+            index is built on first use and rebuilt whenever the book file's
+            size or mtime changes. Default False.
+        index_path: Where to keep the index. Defaults to
+            `<path_to_book_data>.author.idx`. Giving an `index_path` implies `use_index`.
+        workers: The number of processes used to scan the book file, see `scan`.
+        cache_dir: Where to look for a column cache of the book file written by
+            `build_column_cache`. Defaults to `<path_to_book_data>.columns`.
 
     Returns:
         A tuple of `dict` containing the works for the given author or matches for
-            the given author name.
+            the given author name. If `name` is a list, a `dict` mapping each name
+            to its works is returned instead.
         
     Examples:
     
@@ -179,43 +1068,210 @@ def get_books_by_author_name(path_to_book_data: str, path_to_author_data: str, n
         
         >>> get_books_by_author_name('/anvil/projects/tdm/data/goodreads/goodreads_books.json', '/anvil/projects/tdm/data/goodreads/goodreads_book_authors.json', 'J.K. Rowling')[1].get('title')
         'Harry Potter és a Félvér Herceg (Harry Potter, #6)'
+        
+        >>> get_books_by_author_name('/anvil/projects/tdm/data/goodreads/goodreads_books.json', '/anvil/projects/tdm/data/goodreads/goodreads_book_authors.json', 'brandon sandersen', fuzzy=True)[0].get('title')
+        'Edgedancer (The Stormlight Archive #2.5)'
     """
     path_to_book_data = Path(path_to_book_data)
     path_to_author_data = Path(path_to_author_data)
+    names = [name] if isinstance(name, str) else list(name)
     
-    author_ids = set()
-    works = []
+    # get the author id's for every name in one pass
+    author_ids = {n: set() for n in names}
+    if fuzzy:
+        for n in names:
+            matches = find_authors(path_to_author_data, n, limit=FUZZY_CANDIDATES)
+            # only the best scoring name (and any exact ties), not every name that is close enough
+            for match in matches:
+                if match['score'] == matches[0]['score']:
+                    author_ids[n].update(match['author_ids'])
+    else:
+        needles = [_json_needles(n) for n in names]
+        prefilter = None if None in needles else [needle for ns in needles for needle in ns]
+        with open(path_to_author_data, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if prefilter is not None and not any(needle in line for needle in prefilter):
+                    continue
+                d = _loads(line)
+                if d.get('name') in author_ids:
+                    author_ids[d.get('name')].add(d.get('author_id'))
     
-    # get the author id's for the given name
-    with open(path_to_author_data, 'r') as f:
-        for line in f:
-            d = json.loads(line)
-            if name == d.get('name'):
-                author_ids.add(d.get('author_id'))
-                with open(path_to_book_data, 'r') as g:
-                    for line in g:
-                        d = json.loads(line)
-                        # get the authors of the work
-                        for author in d.get('authors'):
-                            if author.get('author_id') in author_ids:
-                                works.append(d)
-                                break
-                                      
-            else:
-                continue
+    works = {n: [] for n in names}
+    all_ids = set().union(*author_ids.values())
+    if not all_ids:
+        return works[name] if isinstance(name, str) else works
+    
+    if use_index or index_path:
+        index_path = index_path or _default_index_path(path_to_book_data, 'author')
+        mm = _open_offset_index(path_to_book_data, index_path, _author_index_keys)
+        offsets = sorted({match for author_id in all_ids
+                          for match in _lookup_offsets(mm, f'author_id:{author_id}')})
+        with open(path_to_book_data, 'rb') as g:
+            for offset, length in offsets:
+                g.seek(offset)
+                d = _loads(g.read(length))
+                book_ids = _book_author_ids(d)
+                for n in names:
+                    if book_ids & author_ids[n]:
+                        works[n].append(d)
+        return works[name] if isinstance(name, str) else works
+    
+    needles = [_json_needles(author_id) for author_id in all_ids]
+    prefilter = None if None in needles else [needle for ns in needles for needle in ns]
+    cache = _fresh_column_cache(path_to_book_data, cache_dir)
+    if cache is not None:
+        column = cache.column('authors')
+        if column is None:
+            rows = []
+        elif prefilter is None:
+            rows = range(cache.rows)
+        else:
+            rows = sorted({row for needle in prefilter for row in column.rows_containing(needle)})
+        for row in rows:
+            book_ids = {author.get('author_id') for author in column[row] or []}
+            if book_ids & all_ids:
+                d = cache.row(row)
+                for n in names:
+                    if book_ids & author_ids[n]:
+                        works[n].append(d)
+    else:
+        # scan the books once, keeping each work once per name
+        for d in scan(path_to_book_data, partial(_has_any_author, frozenset(all_ids)), workers=workers,
+                      prefilter=prefilter):
+            book_ids = _book_author_ids(d)
+            for n in names:
+                if book_ids & author_ids[n]:
+                    works[n].append(d)
              
-    return works
+    return works[name] if isinstance(name, str) else works
+
 
+IMAGE_FETCH_WORKERS = 8
+IMAGE_FETCH_RETRIES = 3
+IMAGE_FETCH_BACKOFF = 0.5
+IMAGE_FETCH_TIMEOUT = 30
+IMAGE_CHUNK_SIZE = 64 * 1024
 
-def scrape_image_from_url(url_str: str, filename: str):
 
+def _image_session(workers: int, retries: int, backoff: float) -> requests.Session:
     """
-    Given a str representing the desired url and filename, this function returns
-    a read .jpg file and returns a byte type object.
+    A `requests.Session` with a keep-alive connection pool large enough for
+    `workers` threads, retrying failed GETs with exponential backoff.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']))
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _cached_image(cache_dir: Path, url: str):
+    """
+    Return the cached bytes for `url`, or None if it was never fetched.
+    """
+    url_file = cache_dir / 'urls' / hashlib.sha256(url.encode('utf-8')).hexdigest()
+    try:
+        digest = url_file.read_text().strip()
+        return (cache_dir / 'blobs' / digest).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _cache_image(cache_dir: Path, url: str, content: bytes) -> None:
+    """
+    Store `content` under its SHA-256, so identical images fetched from
+    different urls are kept once, and point `url` at it.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    for directory, name, data in [('blobs', digest, content),
+                                  ('urls', hashlib.sha256(url.encode('utf-8')).hexdigest(), digest.encode('ascii'))]:
+        path = cache_dir / directory / name
+        if directory == 'blobs' and path.exists():
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'{name}.{uuid.uuid4().hex}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+
+def _fetch_image(session: requests.Session, url: str, cache_dir: Path, timeout: float) -> bytes:
+    if cache_dir is not None:
+        content = _cached_image(cache_dir, url)
+        if content is not None:
+            return content
+    
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        buffer = BytesIO()
+        for chunk in response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+            buffer.write(chunk)
+    content = buffer.getvalue()
+    
+    if cache_dir is not None:
+        _cache_image(cache_dir, url, content)
+    return content
+
+
+def fetch_images(urls: list, workers: int = IMAGE_FETCH_WORKERS, retries: int = IMAGE_FETCH_RETRIES,
+                 backoff: float = IMAGE_FETCH_BACKOFF, cache_dir: str = None, timeout: float = IMAGE_FETCH_TIMEOUT,
+                 session: requests.Session = None) -> list:
+    """
+    Given a list of urls, `fetch_images` downloads them concurrently, straight
+    into memory, and returns their contents as `bytes`.
+    
+    Args:
+        urls: The urls of the images of interest. Repeated urls are fetched once.
+        workers: The most downloads running at the same time. Default 8.
+        retries: How many times a failed download (connection error or a 429/5xx
+            response) is retried. Default 3.
+        backoff: The exponential backoff factor, in seconds, between retries. Default 0.5.
+        cache_dir: A directory to cache images in. Images are stored by the
+            SHA-256 of their contents and looked up by the SHA-256 of their url,
+            so a url is never downloaded twice and identical images are
+            stored once. Default None disables the cache.
+        timeout: Seconds to wait for the server before giving up. Default 30.
+        session: A `requests.Session` to reuse. Default None creates a pooled
+            keep-alive session for this call.
+
+    Returns:
+        A list with the `bytes` of each image, in the same order as `urls`.
+        
+    Examples:
+    
+        >>> images = fetch_images(['http://images.gr-assets.com/books/1310220028m/5333265.jpg'])
+        >>> print(type(images[0]))
+        <class 'bytes'>
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else None
+    own_session = session is None
+    if own_session:
+        session = _image_session(workers, retries, backoff)
+    try:
+        unique_urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique_urls)))) as pool:
+            contents = dict(zip(unique_urls, pool.map(partial(_fetch_image, session, cache_dir=cache_dir,
+                                                              timeout=timeout), unique_urls)))
+    finally:
+        if own_session:
+            session.close()
+    return [contents[url] for url in urls]
+
+
+def scrape_image_from_url(url_str: str, filename: str = None):
+
+    """
+    Given a str representing the desired url, this function downloads the
+    image into memory and returns a byte type object. See `fetch_images` to
+    download many images at once.
         
     Args:
         url_str: The url from which the .jpg file is loaded from.
-        path_to_author_data: The absolute path to the `goodreads_book_authors.json` file.
+        filename: Unused. Images are no longer written to disk, this argument
+            is kept so existing calls keep working.
         
     Returns:
         A byte type object
@@ -230,11 +1286,4 @@ def scrape_image_from_url(url_str: str, filename: str):
         <class 'bytes'>
     """
 
-    response = requests.get(url_str, stream = True)
-    file = open(filename+'.jpg', 'wb')
-    shutil.copyfileobj(response.raw, file)
-    BR_file = open(filename+".jpg", "rb")
-    BR_file = BR_file.read()
-    path = os.getcwd()
-    os.remove(path + '/' +  filename + ".jpg")
-    return  BR_file
+    return fetch_images([url_str])[0]
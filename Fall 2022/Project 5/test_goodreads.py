@@ -1,13 +1,24 @@
 import unittest
 import os
+import sys
 from pathlib import Path
 import json
+import gzip
 import shutil
 import uuid
 import requests
 import hashlib
 from io import BytesIO
 import pytest
+from functools import partial
+from goodreads import split_json_to_n_parts as split_parts
+from goodreads import get_book_with_isbn, get_books_with_isbns, get_books_by_author_name, find_authors
+from goodreads import scan, _field_equals, _loads, _json_needles
+from goodreads import build_column_cache, read_columns, ColumnCache, fetch_images
+
+# stand_in_server.py is shared with the other projects' tests, one directory up
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from stand_in_server import stand_in_server
 
 
 def split_json_to_n_parts(path_to_json: str,number_files: int,output_dir: str) -> None:
@@ -181,4 +192,211 @@ def test_scrape_image_from_url(url_str, filename):
     tested = print(type(BR_file))
     path = os.getcwd()
     testing = print(type(scrape_image_from_url(url_str, filename)))
-    assert tested == testing
\ No newline at end of file
+    assert tested == testing
+
+
+def _write_lines(path, n):
+    with open(path, 'w') as f:
+        for i in range(n):
+            f.write(json.dumps({'key1': f'value{i}', 'key2': 'x' * (i % 7), 'key3': i}) + '\n')
+
+
+@pytest.mark.parametrize('num_lines,number_files,compress',[(7,2,False),(100,8,False),(3,5,False),(50,3,True)])
+def test_split_json_to_n_parts_by_bytes(tmp_path, num_lines, number_files, compress):
+    test_json = tmp_path / 'test.json'
+    _write_lines(test_json, num_lines)
+    output_dir = tmp_path / 'out'
+    os.mkdir(output_dir)
+    split_parts(str(test_json), number_files, str(output_dir), by_bytes=True, compress=compress)
+    parts = sorted(output_dir.iterdir(), key=lambda p: int(p.name.split('_')[-1].split('.')[0]))
+    assert 1 <= len(parts) <= number_files
+    lines = []
+    for part in parts:
+        opener = gzip.open if compress else open
+        with opener(part, 'rt') as p:
+            lines.extend(p.readlines())
+    assert lines == open(test_json).readlines()
+
+
+def _write_books(path, n, start=0):
+    with open(path, 'w') as f:
+        for i in range(start, start + n):
+            book = {'isbn': f'{i:010d}' if i % 5 else '', 'isbn13': f'978{i:010d}', 'book_id': str(i),
+                    'title': f'Book {i}', 'authors': [{'author_id': str(i % 4), 'role': ''}]}
+            f.write(json.dumps(book) + '\n')
+
+
+def test_get_book_with_isbn_index(tmp_path):
+    books = tmp_path / 'goodreads_books.json'
+    _write_books(books, 200)
+    index_path = tmp_path / 'books.isbn.idx'
+    for isbn in ['0000000001', '0000000199', '0000000005', 'missing']:
+        assert get_book_with_isbn(str(books), isbn, index_path=str(index_path)) == get_book_with_isbn(str(books), isbn)
+    assert index_path.exists()
+    
+    found = get_books_with_isbns(str(books), ['9780000000123', '9780000000007', 'nope'], field='isbn13', index_path=str(index_path))
+    assert found['9780000000123']['title'] == 'Book 123'
+    assert found['9780000000007']['book_id'] == '7'
+    assert found['nope'] is None
+    
+    # rewriting the source must trigger a rebuild of the index
+    _write_books(books, 50, start=1000)
+    os.utime(books, ns=(0, 10**9))
+    assert get_book_with_isbn(str(books), '0000000001', index_path=str(index_path)) is None
+    assert get_book_with_isbn(str(books), '0000001001', index_path=str(index_path))['title'] == 'Book 1001'
+
+
+def _write_authors(path):
+    with open(path, 'w') as f:
+        for author_id, name in [('0', 'Ann Author'), ('1', 'Bob Writer'), ('2', 'Ann Author'), ('3', 'Cy Scribe')]:
+            f.write(json.dumps({'author_id': author_id, 'name': name, 'average_rating': '4.00'}) + '\n')
+
+
+@pytest.mark.parametrize('use_index',[False, True])
+def test_get_books_by_author_name(tmp_path, use_index):
+    books = tmp_path / 'goodreads_books.json'
+    authors = tmp_path / 'goodreads_book_authors.json'
+    _write_books(books, 40)
+    _write_authors(authors)
+    
+    works = get_books_by_author_name(str(books), str(authors), 'Ann Author', use_index=use_index)
+    # 'Ann Author' has two author records, but each work is returned only once
+    assert [w['book_id'] for w in works] == [str(i) for i in range(40) if i % 4 in (0, 2)]
+    
+    batch = get_books_by_author_name(str(books), str(authors), ['Bob Writer', 'Nobody'], use_index=use_index)
+    assert [w['book_id'] for w in batch['Bob Writer']] == [str(i) for i in range(40) if i % 4 == 1]
+    assert batch['Nobody'] == []
+    
+    # a name with no safe prefilter scans every line of the author file, blank ones included
+    with open(authors, 'a') as f:
+        f.write('\n' + json.dumps({'author_id': '3', 'name': 'José Saramago', 'average_rating': '4.00'}) + '\n')
+    works = get_books_by_author_name(str(books), str(authors), 'José Saramago', use_index=use_index)
+    assert [w['book_id'] for w in works] == [str(i) for i in range(40) if i % 4 == 3]
+
+
+@pytest.mark.parametrize('workers,chunk_size',[(1, 64), (2, 64), (3, 1), (None, 1 << 20)])
+def test_scan(tmp_path, workers, chunk_size):
+    books = tmp_path / 'goodreads_books.json'
+    _write_books(books, 120)
+    matches = list(scan(str(books), partial(_field_equals, 'isbn', ''), fields=['book_id', 'title'],
+                        workers=workers, chunk_size=chunk_size))
+    assert matches == [{'book_id': str(i), 'title': f'Book {i}'} for i in range(0, 120, 5)]
+    assert get_book_with_isbn(str(books), '0000000077', workers=workers)['title'] == 'Book 77'
+
+
+def test_loads_matches_json():
+    for line in [b'{"a": 123456789012345678901234567890}', b'{"a": NaN, "b": [1.5, "x"]}', b'{"t": "caf\\u00e9"}']:
+        assert repr(_loads(line)) == repr(json.loads(line))
+
+
+@pytest.mark.parametrize('workers',[1, 2])
+def test_scan_prefilter(tmp_path, workers):
+    books = tmp_path / 'goodreads_books.json'
+    _write_books(books, 60)
+    for isbn in ['0000000012', '', 'missing']:
+        predicate = partial(_field_equals, 'isbn', isbn)
+        assert list(scan(str(books), predicate, workers=workers, chunk_size=256, prefilter=_json_needles(isbn))) == \
+            list(scan(str(books), predicate, workers=workers, chunk_size=256))
+    assert _json_needles('José') is None
+    assert _json_needles('a/b') is None
+
+
+def test_column_cache(tmp_path):
+    books = tmp_path / 'goodreads_books.json'
+    authors = tmp_path / 'goodreads_book_authors.json'
+    _write_books(books, 30)
+    _write_authors(authors)
+    with open(books, 'a') as f:
+        # a key that only shows up late, a missing key and a non-string value
+        f.write(json.dumps({'isbn': '9999999999', 'book_id': '30', 'title': 'Café', 'num_pages': 12,
+                            'authors': [{'author_id': '1', 'role': ''}]}) + '\n')
+    expected = [json.loads(line) for line in open(books)]
+    
+    cache_dir = tmp_path / 'books.columns'
+    build_column_cache(str(books), str(cache_dir))
+    cache = ColumnCache(str(cache_dir))
+    assert cache.is_fresh(str(books))
+    assert [cache.row(i) for i in range(cache.rows)] == expected
+    assert list(read_columns(str(books), ['title', 'num_pages'], str(cache_dir))) == \
+        [{k: d[k] for k in ('title', 'num_pages') if k in d} for d in expected]
+    
+    assert get_book_with_isbn(str(books), '9999999999', cache_dir=str(cache_dir))['num_pages'] == 12
+    assert get_book_with_isbn(str(books), '0000000003', cache_dir=str(cache_dir)) == expected[3]
+    assert get_book_with_isbn(str(books), '000000000', cache_dir=str(cache_dir)) is None
+    assert get_books_by_author_name(str(books), str(authors), 'Bob Writer', cache_dir=str(cache_dir)) == \
+        get_books_by_author_name(str(books), str(authors), 'Bob Writer', workers=1)
+    
+    # a stale cache is ignored
+    with open(books, 'a') as f:
+        f.write(json.dumps({'isbn': '8888888888', 'title': 'Late'}) + '\n')
+    assert not cache.is_fresh(str(books))
+    assert get_book_with_isbn(str(books), '8888888888', cache_dir=str(cache_dir))['title'] == 'Late'
+
+
+def test_find_authors(tmp_path):
+    books = tmp_path / 'goodreads_books.json'
+    authors = tmp_path / 'goodreads_book_authors.json'
+    _write_books(books, 40)
+    _write_authors(authors)
+    index_path = tmp_path / 'authors.names.pkl'
+    
+    matches = find_authors(str(authors), 'ann autor', index_path=str(index_path))
+    assert matches[0]['name'] == 'Ann Author'
+    assert sorted(matches[0]['author_ids']) == ['0', '2']
+    assert matches[0]['score'] >= 80
+    assert all(a['score'] >= b['score'] for a, b in zip(matches, matches[1:]))
+    assert find_authors(str(authors), 'zzzzzz') == []
+    assert index_path.exists()
+    
+    assert get_books_by_author_name(str(books), str(authors), 'bob writter', fuzzy=True) == \
+        get_books_by_author_name(str(books), str(authors), 'Bob Writer')
+    
+    # only the closest name's works come back, not those of every name scoring at least 80
+    with open(authors, 'w') as f:
+        for author_id, name in [('0', 'Brandon Anderson'), ('1', 'Brandon Sanderson'), ('2', 'Brenda Sanderson')]:
+            f.write(json.dumps({'author_id': author_id, 'name': name, 'average_rating': '4.00'}) + '\n')
+    assert len(find_authors(str(authors), 'brandon sandersen')) > 1
+    for query in ['brandon sandersen', 'Brandon Sanderson']:
+        works = get_books_by_author_name(str(books), str(authors), query, fuzzy=True)
+        assert [w['book_id'] for w in works] == [str(i) for i in range(40) if i % 4 == 1]
+
+
+@pytest.fixture
+def image_server():
+    """
+    A local stand-in for the goodreads image host. `/flaky/...` paths fail
+    with a 503 the first time they are requested.
+    """
+    failed = set()
+    
+    def respond(path, headers):
+        if path.startswith('/flaky/') and path not in failed:
+            failed.add(path)
+            return 503, {}, b''
+        if path.startswith('/missing/'):
+            return 404, {}, b''
+        return 200, {'Content-Type': 'image/jpeg'}, hashlib.sha256(path.replace('/flaky', '').encode()).digest() * 1000
+    
+    with stand_in_server(respond) as server:
+        yield server
+
+
+def test_fetch_images(image_server, tmp_path):
+    base, hits = image_server
+    urls = [f'{base}/books/{i}.jpg' for i in range(6)] + [f'{base}/books/0.jpg', f'{base}/flaky/books/1.jpg']
+    images = fetch_images(urls, workers=3, backoff=0, cache_dir=str(tmp_path))
+    assert [type(image) for image in images] == [bytes] * len(urls)
+    assert images[0] == images[6] == hashlib.sha256(b'/books/0.jpg').digest() * 1000
+    # the retried url serves the same picture as /books/1.jpg, so it is only stored once
+    assert images[7] == images[1]
+    assert len(list((tmp_path / 'blobs').iterdir())) == 6
+    assert hits.count('/books/0.jpg') == 1
+    assert hits.count('/flaky/books/1.jpg') == 2
+    
+    # everything is served from the cache the second time around
+    number_hits = len(hits)
+    assert fetch_images(urls, cache_dir=str(tmp_path)) == images
+    assert len(hits) == number_hits
+    
+    with pytest.raises(requests.HTTPError):
+        fetch_images([f'{base}/missing/cover.jpg'], backoff=0)
@@ -2,44 +2,348 @@
 Module for TDM 30100 project 6.
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
+import json
+import hashlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 import plotly.express as px
+import plotly.io
 import requests
+from requests.adapters import HTTPAdapter
 import lxml.html
 from fuzzywuzzy import fuzz
 
 
+def _datetimes_to_ticks(datetimes) -> tuple:
+    """
+    Convert anything `pd.to_datetime` understands to an int64 array of
+    ticks since the epoch, at the resolution pandas parsed them with,
+    dropping missing values. Also returns the number of ticks per second.
+    """
+    datetimes = pd.to_datetime(pd.Series(datetimes))
+    if datetimes.dt.tz is not None:
+        datetimes = datetimes.dt.tz_convert('UTC').dt.tz_localize(None)
+    datetimes = datetimes.dropna()
+    per_second = 10 ** {'s': 0, 'ms': 3, 'us': 6, 'ns': 9}[datetimes.dt.unit]
+    return datetimes.to_numpy().view('int64'), per_second
+
+
+def _is_monotonic(ticks: np.ndarray) -> bool:
+    return len(ticks) < 2 or bool((ticks[1:] >= ticks[:-1]).all())
+
+
+def _ticks_to_hours(ticks, per_second: int) -> np.float64:
+    # same arithmetic as `Series.dt.total_seconds() / 3600`, which divides in the series' own resolution
+    return np.float64(ticks) / per_second / 3600
+
+
 def find_longest_timegap(datetime_series: pd.Series) -> float:
     """
     Given a `pandas` series, output the largest time gap between 
     consecutive datetimes, in hours.
     """
-    # convert column to datetime
-    datetime_series = pd.to_datetime(datetime_series)
+    # convert column to int64 ticks
+    ticks, per_second = _datetimes_to_ticks(datetime_series)
+    if len(ticks) < 2:
+        return np.float64(np.nan)
+    
+    # sort from least recent to most recent, unless it already is
+    if not _is_monotonic(ticks):
+        ticks = np.sort(ticks)
+    
+    # largest difference between consecutive times
+    return _ticks_to_hours(np.diff(ticks).max(), per_second)
+
+
+def find_longest_timegap_chunked(chunks, column: str = None) -> float:
+    """
+    Given an iterable of chunks of datetimes, for example
+    `pd.read_csv(..., chunksize=...)`, output the largest time gap between
+    consecutive datetimes, in hours, without holding more than one chunk
+    in memory.
+    
+    Each chunk may be unsorted, but the chunks must come in chronological
+    order: every datetime in a chunk must be at or after the last datetime
+    of the chunks before it. A ValueError is raised otherwise.
+    
+    `column` picks the column to use when the chunks are data frames.
+    """
+    # chunks can be parsed at different resolutions, so gaps are kept in
+    # nanoseconds and converted back to the finest resolution seen at the end
+    longest = None
+    previous_last = None
+    per_second = 1
+    for chunk in chunks:
+        if column is not None:
+            chunk = chunk[column]
+        ticks, chunk_per_second = _datetimes_to_ticks(chunk)
+        if len(ticks) == 0:
+            continue
+        per_second = max(per_second, chunk_per_second)
+        ns = ticks * (10**9 // chunk_per_second)
+        if not _is_monotonic(ns):
+            ns = np.sort(ns)
+        
+        # the gap across the boundary with the previous chunk
+        if previous_last is not None:
+            if ns[0] < previous_last:
+                raise ValueError("Chunks must be in chronological order to find the longest time gap.")
+            gap = int(ns[0] - previous_last)
+            longest = gap if longest is None else max(longest, gap)
+        if len(ns) > 1:
+            gap = int(np.diff(ns).max())
+            longest = gap if longest is None else max(longest, gap)
+        previous_last = ns[-1]
+        
+    if longest is None:
+        return np.float64(np.nan)
+    return _ticks_to_hours(longest // (10**9 // per_second), per_second)
+
+
+def top_timegaps_by_group(datetime_series: pd.Series, groups: pd.Series, k: int = 1) -> pd.DataFrame:
+    """
+    Given a `pandas` series of datetimes and a series of the same length with
+    a group key for each one (a station, for example), output the `k` largest
+    time gaps between consecutive datetimes within each group.
+    
+    The result has one row per gap with the group, the datetimes at the start
+    and end of the gap, and its length in hours, largest gap first within
+    each group.
+    """
+    group_name = groups.name if getattr(groups, 'name', None) is not None else 'group'
+    datetimes = pd.to_datetime(pd.Series(np.asarray(datetime_series)))
+    dat = pd.DataFrame({group_name: np.asarray(groups), 'end': datetimes}).dropna()
+    dat = dat.sort_values([group_name, 'end'], kind='stable')
     
-    # sort from least recent to most recent
-    datetime_series = datetime_series.sort_values(ascending=True)
+    # consecutive rows within the same group form a gap
+    same_group = dat[group_name].eq(dat[group_name].shift())
+    dat['start'] = dat['end'].shift()
+    dat = dat.loc[same_group]
+    dat['gap_hours'] = (dat['end'] - dat['start']).dt.total_seconds() / 3600
     
-    # create series of consecutive time differences
-    time_diff = (datetime_series.diff(-1).dt.total_seconds().abs().max()) / 3600
-    return time_diff
+    dat = dat.sort_values([group_name, 'gap_hours'], ascending=[True, False], kind='stable')
+    dat = dat.groupby(group_name, sort=False).head(k)
+    return dat[[group_name, 'start', 'end', 'gap_hours']].reset_index(drop=True)
 
     
-def space_in_dir(directory: str) -> None:
+def _scan_one_dir(directory: str, cached) -> tuple:
+    """
+    Return the directory's mtime, the total size of the files directly in it,
+    and its subdirectories. `cached` is an earlier result for the same
+    directory, reused as is if the directory's mtime hasn't changed.
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None, 0, []
+    if cached is not None and cached[0] == mtime_ns:
+        return cached
+    
+    total = 0
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    # like Path.glob('**/*'): don't descend into symlinked directories,
+                    # but count files reached through symlinks
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        total += entry.stat().st_size
+                except OSError:
+                    continue
+    except OSError:
+        # unreadable, deleted since the stat, or not a directory at all
+        pass
+    return mtime_ns, total, subdirs
+
+
+def dir_space_breakdown(directory: str, workers: int = 16, cache_path: str = None) -> dict:
+    """
+    Given a directory, return a dictionary with the amount of space the files
+    in each of its subdirectories, recursively, take up, keyed by the
+    subdirectory's name. Files directly in `directory` are counted under '.'.
+    
+    Directories are listed with `os.scandir`, a whole level of the tree at a
+    time, across `workers` threads. If `cache_path` is given, each
+    directory's listing is saved there and only re-listed when the
+    directory's mtime changes. A directory's mtime only changes when entries
+    are added, removed or renamed, so a file that grows in place is not
+    noticed until its directory is re-listed.
+    """
+    root = os.path.abspath(directory)
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    
+    breakdown = {'.': 0}
+    listings = {}
+    level = [(root, '.')]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            results = pool.map(lambda item: _scan_one_dir(item[0], cache.get(item[0])), level)
+            next_level = []
+            for (path, top), (mtime_ns, total, subdirs) in zip(level, results):
+                if mtime_ns is None:
+                    continue
+                listings[path] = [mtime_ns, total, subdirs]
+                breakdown[top] = breakdown.get(top, 0) + total
+                for subdir in subdirs:
+                    next_level.append((subdir, os.path.basename(subdir) if top == '.' else top))
+            level = next_level
+    
+    if cache_path:
+        tmp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(listings, f)
+        os.replace(tmp_path, cache_path)
+    return breakdown
+
+    
+def space_in_dir(directory: str, workers: int = 16, cache_path: str = None) -> int:
     """
     Given a directory, return the amount of space the files in the directory,
-    recursively, take up.
+    recursively, take up. See `dir_space_breakdown` for `workers` and `cache_path`.
+    """
+    return sum(dir_space_breakdown(directory, workers, cache_path).values())
+    
+    
+
+ATHLETE_EVENTS_PATH = "/anvil/projects/tdm/data/olympics/athlete_events.csv"
+# where load_athlete_events pickles the parsed csv for other processes, if set
+ATHLETE_EVENTS_CACHE = os.getenv('ATHLETE_EVENTS_CACHE')
+ATHLETE_EVENTS_DTYPES = {'ID': 'int32', 'Age': 'Int8', 'NOC': 'category', 'Event': 'category', 'Medal': 'category'}
+
+_athlete_events = {}
+_medal_summaries = {}
+
+
+def _source_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def load_athlete_events(path: str = ATHLETE_EVENTS_PATH, cache_path: str = None) -> pd.DataFrame:
+    """
+    Read the columns of `athlete_events.csv` that `event_plotter` needs, once,
+    with compact dtypes (categoricals for Event, NOC and Medal, small ints for
+    ID and Age). The result is kept in memory and, if `cache_path` is given,
+    pickled there, and reused until the csv changes.
+    """
+    key = _source_key(path)
+    if key in _athlete_events:
+        return _athlete_events[key]
+    
+    dat = None
+    if cache_path and os.path.exists(cache_path):
+        cached_key, cached = pd.read_pickle(cache_path)
+        if cached_key == key:
+            dat = cached
+    if dat is None:
+        dat = pd.read_csv(path, usecols=list(ATHLETE_EVENTS_DTYPES), dtype=ATHLETE_EVENTS_DTYPES)
+        if cache_path:
+            tmp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+            pd.to_pickle((key, dat), tmp_path)
+            os.replace(tmp_path, cache_path)
+    
+    _athlete_events.clear()
+    _athlete_events[key] = dat
+    return dat
+
+
+def medal_summary(path: str = ATHLETE_EVENTS_PATH, cache_path: str = None) -> dict:
+    """
+    Return a dictionary mapping every event to a data frame with the count of
+    each medal per country and the average age of the medalists, computed for
+    all events with a single groupby.
+    """
+    key = _source_key(path)
+    if key in _medal_summaries:
+        return _medal_summaries[key]
+    
+    dat = load_athlete_events(path, cache_path)
+    dat = dat.loc[dat['Medal'].notna(), ]
+    dat = dat.groupby(["Event", "Medal", "NOC"], observed=True, sort=True).agg(Age=('Age', 'mean'), Count=('ID', 'count'))
+    dat = dat.reset_index()
+    dat['Medal'] = dat['Medal'].astype(str)
+    dat['NOC'] = dat['NOC'].astype(str)
+    dat['Age'] = dat['Age'].astype('float64')
+    dat['Count'] = dat['Count'].astype('int64')
+    
+    summary = {event: group.drop(columns='Event').reset_index(drop=True)
+               for event, group in dat.groupby('Event', observed=True, sort=False)}
+    _medal_summaries.clear()
+    _medal_summaries[key] = summary
+    return summary
+
+
+def _write_figure(figure_json: str, image_path: str) -> None:
     """
-    root_directory = Path(directory)
-    root_sum = (sum(f.stat().st_size for f in root_directory.glob('**/*') if f.is_file()))
-    return root_sum
+    Export a figure serialized with `fig.to_json()` to `image_path`. Runs in
+    the worker processes of `render_figures`.
+    """
+    plotly.io.from_json(figure_json).write_image(image_path)
+
+
+def render_figures(figures: dict, workers: int = None) -> list:
+    """
+    Given a dictionary mapping image paths to plotly figures, export every
+    figure to its path, in parallel across `workers` processes.
     
+    A SHA-256 of each figure's data and layout is saved next to its image
+    (`<image path>.sha256`), and figures whose image already exists with
+    the same hash are not exported again. Returns the paths that were exported.
+    """
+    jobs = []
+    for image_path, fig in figures.items():
+        figure_json = fig.to_json()
+        digest = hashlib.sha256(figure_json.encode('utf-8')).hexdigest()
+        digest_path = Path(f"{image_path}.sha256")
+        if Path(image_path).exists() and digest_path.exists() and digest_path.read_text() == digest:
+            continue
+        jobs.append((str(image_path), figure_json, digest, digest_path))
+    
+    if len(jobs) == 1 or workers == 1:
+        for image_path, figure_json, _, _ in jobs:
+            _write_figure(figure_json, image_path)
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+            list(pool.map(_write_figure, [job[1] for job in jobs], [job[0] for job in jobs]))
     
+    for _, _, digest, digest_path in jobs:
+        digest_path.write_text(digest)
+    return [job[0] for job in jobs]
+
+
+def _event_data(event: str, path: str, cache_path: str = None) -> pd.DataFrame:
+    summary = medal_summary(path, cache_path)
+    if event in summary:
+        return summary[event].copy()
+    return pd.DataFrame({'Medal': pd.Series(dtype=str), 'NOC': pd.Series(dtype=str),
+                         'Age': pd.Series(dtype='float64'), 'Count': pd.Series(dtype='int64')})
 
-def event_plotter(event: str) -> pd.DataFrame:
+
+def _event_figures(dat: pd.DataFrame, output_dir: str) -> dict:
+    """
+    Build the Gold, Silver and Bronze bar charts for one event's data, keyed
+    by the path each one is saved to.
+    """
+    figures = {}
+    for medal in ["Gold", "Silver", "Bronze"]:
+        fig = px.bar(dat.loc[dat['Medal']==medal,], x='NOC', y='Count', text="Age", title=medal)
+        figures[f"{output_dir}/{medal.lower()}.jpeg"] = fig
+    return figures
+
+
+def event_plotter(event: str, path: str = ATHLETE_EVENTS_PATH, output_dir: str = None,
+                  headless: bool = False, workers: int = 3, cache_path: str = ATHLETE_EVENTS_CACHE) -> pd.DataFrame:
     """
     Given the name of an event, create a plot for each of the Gold, Silver, and Bronze medals.
     The plots contain the count of the type of medal on the y-axis, the country on the x-axis
@@ -47,51 +351,123 @@ def event_plotter(event: str) -> pd.DataFrame:
     
     Plots should be output in Jupyter, as well as saved to the executor's $HOME directory as
     bronze.jpeg, silver.jpeg, and gold.jpeg. The dataframe with the data should be returned.
+    `output_dir` saves the plots somewhere other than $HOME. The three images
+    are exported in parallel by `render_figures`, which skips any whose data
+    hasn't changed since the last export, and `headless` skips showing them.
+    `cache_path` is where the parsed csv is pickled for the next process, see
+    `load_athlete_events`; it defaults to the ATHLETE_EVENTS_CACHE environment variable.
     """
-    dat = pd.read_csv("/anvil/projects/tdm/data/olympics/athlete_events.csv")
-    dat = dat.loc[dat['Event'] == event,]
-    dat = dat.loc[dat['Medal'].notna(), ]
-    counts = dat.groupby(["Medal", "NOC"]).count()['ID'].reset_index()
-    dat = dat.groupby(["Medal", "NOC"]).mean()['Age'].reset_index()
-    dat = pd.merge(dat, counts, how="inner", on=['Medal', 'NOC'])
-    dat.rename(columns={"ID":"Count"}, inplace=True)
-    gold = px.bar(dat.loc[dat['Medal']=="Gold",], x='NOC', y='Count', text="Age", title="Gold")
-    gold.write_image(f"{os.getenv('HOME')}/gold.jpeg")
-    silver = px.bar(dat.loc[dat['Medal']=="Silver",], x='NOC', y='Count', text="Age", title="Silver")
-    silver.write_image(f"{os.getenv('HOME')}/silver.jpeg")
-    bronze = px.bar(dat.loc[dat['Medal']=="Bronze",], x='NOC', y='Count', text="Age", title="Bronze")
-    bronze.write_image(f"{os.getenv('HOME')}/bronze.jpeg")
-    
-    gold.show()
-    silver.show()
-    bronze.show()
+    output_dir = output_dir or os.getenv('HOME')
+    dat = _event_data(event, path, cache_path)
+    figures = _event_figures(dat, output_dir)
+    render_figures(figures, workers)
+    
+    if not headless:
+        for fig in figures.values():
+            fig.show()
     return dat
 
 
-def player_info(name: str) -> str:
+def events_plotter(events: list, output_dir: str, path: str = ATHLETE_EVENTS_PATH,
+                   headless: bool = True, workers: int = None, cache_path: str = ATHLETE_EVENTS_CACHE) -> dict:
     """
-    Given the name of a soccer player, `player_info` 
-    will scrape fbref.com and present some statistics.
+    Given a list of events, make the plots `event_plotter` makes for each of
+    them, saving the plots for every event to its own subdirectory of
+    `output_dir`. All of the images are exported together by one pool of
+    `workers` processes, and unchanged ones are skipped. `cache_path` is as
+    for `event_plotter`. Returns a dictionary mapping each event to its dataframe.
     """
-    result = ""
+    results = {}
+    figures = {}
+    for event in events:
+        event_dir = Path(output_dir) / _event_dirname(event)
+        event_dir.mkdir(parents=True, exist_ok=True)
+        results[event] = _event_data(event, path, cache_path)
+        figures.update(_event_figures(results[event], str(event_dir)))
+    render_figures(figures, workers)
     
-    # get first two letters of last name
-    last_last_name = name.split(" ")[len(name.split(" "))-1]
-    players_page = f'https://fbref.com/en/players/{last_last_name[0:2]}/'
-    resp = requests.get(players_page)
+    if not headless:
+        for fig in figures.values():
+            fig.show()
+    return results
+
+
+def _event_dirname(event: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in event).strip("_")
+
+
+FBREF_URL = 'https://fbref.com'
+PLAYER_MATCH_SCORE = 90
+HTTP_TIMEOUT = 30
+
+
+def _http_session(workers: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _get_page(session: requests.Session, url: str, cache_dir: Path = None) -> str:
+    """
+    GET `url` and return its text. If `cache_dir` is given, responses with an
+    ETag or Last-Modified header are saved there, and later requests for the
+    same url are made conditional so an unchanged page is not downloaded again.
+    """
+    headers = {}
+    cached = None
+    if cache_dir is not None:
+        cache_file = cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+        if cache_file.exists():
+            cached = json.loads(cache_file.read_text())
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+    
+    resp = session.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+    if resp.status_code == 304 and cached is not None:
+        return cached['text']
     if resp.status_code != 200:
-        raise ValueError(f"Failed to scrape {players_page}")
+        raise ValueError(f"Failed to scrape {url}")
     
-    tree = lxml.html.fromstring(resp.text)
+    etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+    if cache_dir is not None and (etag or last_modified):
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified, 'text': resp.text}))
+        os.replace(tmp_file, cache_file)
+    return resp.text
+
+
+def _players_page_links(html: str) -> list:
+    """
+    The (name, player id) of every player linked from an fbref players index page.
+    """
+    tree = lxml.html.fromstring(html)
     elements = tree.xpath("//div[starts-with(@id, 'all_')]/div[@class='section_content']/p/a")
-    for e in elements:
-        if fuzz.ratio(name.lower(), e.get("href").split("/")[-1].replace("-", " ").lower()) > 90:
-            player_url = f'https://fbref.com/en/players/{e.get("href").split("/")[-2]}/'
-            
-    if not player_url:
-        raise ValueError(f"Could not find player {name}.")
-        
-    player = lxml.html.fromstring(requests.get(player_url).text)
+    return [(e.get("href").split("/")[-1].replace("-", " ").lower(), e.get("href").split("/")[-2])
+            for e in elements]
+
+
+def _match_player(name: str, links: list) -> str:
+    """
+    Return the id of the player in `links` whose name best matches `name`,
+    scoring each link once, or None if none scores above `PLAYER_MATCH_SCORE`.
+    """
+    best_score, player_id = PLAYER_MATCH_SCORE, None
+    for link_name, link_id in links:
+        score = fuzz.ratio(name.lower(), link_name)
+        # ties go to the later link
+        if score > PLAYER_MATCH_SCORE and score >= best_score:
+            best_score, player_id = score, link_id
+    return player_id
+
+
+def _player_summary(html: str) -> str:
+    result = ""
+    player = lxml.html.fromstring(html)
     
     # get the actual player name
     name = player.xpath("//div[@id='info']/div[@id='meta']//h1/span")[0].text
@@ -108,4 +484,56 @@ def player_info(name: str) -> str:
         total += int(g.text)
     result+=f"Total goals: {total}"
         
-    return result
\ No newline at end of file
+    return result
+
+
+def _players_page_prefix(name: str) -> str:
+    # first two letters of last name
+    last_last_name = name.split(" ")[len(name.split(" "))-1]
+    return last_last_name[0:2]
+
+
+def players_info(names: list, base_url: str = FBREF_URL, cache_dir: str = None, workers: int = 4,
+                 session: requests.Session = None) -> list:
+    """
+    Given a list of soccer player names, `players_info` scrapes fbref.com
+    and presents the same statistics as `player_info` for each of them.
+    
+    All requests share one pooled session and run `workers` at a time. Each
+    players index page is fetched once, however many of the names share its
+    two letter prefix. If `cache_dir` is given, pages are cached on disk and
+    re-validated with their ETag / Last-Modified headers.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else None
+    own_session = session is None
+    if own_session:
+        session = _http_session(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            prefixes = list(dict.fromkeys(_players_page_prefix(name) for name in names))
+            index_pages = pool.map(lambda prefix: _get_page(session, f'{base_url}/en/players/{prefix}/', cache_dir),
+                                   prefixes)
+            links = {prefix: _players_page_links(html) for prefix, html in zip(prefixes, index_pages)}
+            
+            player_urls = []
+            for name in names:
+                player_id = _match_player(name, links[_players_page_prefix(name)])
+                if player_id is None:
+                    raise ValueError(f"Could not find player {name}.")
+                player_urls.append(f'{base_url}/en/players/{player_id}/')
+            
+            unique_urls = list(dict.fromkeys(player_urls))
+            pages = dict(zip(unique_urls, pool.map(lambda url: _get_page(session, url, cache_dir), unique_urls)))
+    finally:
+        if own_session:
+            session.close()
+    return [_player_summary(pages[url]) for url in player_urls]
+
+
+def player_info(name: str, base_url: str = FBREF_URL, cache_dir: str = None) -> str:
+    """
+    Given the name of a soccer player, `player_info` 
+    will scrape fbref.com and present some statistics.
+    See `players_info` to look up many players at once.
+    """
+    return players_info([name], base_url, cache_dir, workers=1)[0]
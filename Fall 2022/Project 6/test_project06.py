@@ -1,9 +1,20 @@
 import pytest
 import pandas as pd
+import numpy as np
 import hashlib
 import os
+import sys
+import subprocess
+from pathlib import Path
 
 from project06 import find_longest_timegap, space_in_dir, event_plotter, player_info
+from project06 import find_longest_timegap_chunked, top_timegaps_by_group, dir_space_breakdown
+from project06 import load_athlete_events, medal_summary, render_figures, players_info, events_plotter
+import project06
+
+# stand_in_server.py is shared with the other projects' tests, one directory up
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from stand_in_server import stand_in_server
 
 def test_find_longest_timegap():
     weather = pd.read_csv("/anvil/projects/tdm/etc/time_sample.csv")
@@ -11,10 +22,89 @@ def test_find_longest_timegap():
     assert find_longest_timegap(weather['observation_time']) == 23.75
     
 
+def test_find_longest_timegap_chunked(tmp_path):
+    times = pd.Series(["2022-10-01 00:00", "2022-10-01 06:00", "2022-10-02 05:45", "2022-10-02 06:00",
+                       "2022-10-02 07:30", "2022-10-03 07:15"])
+    pd.DataFrame({'observation_time': times}).to_csv(tmp_path / "time_sample.csv", index=False)
+    chunks = pd.read_csv(tmp_path / "time_sample.csv", chunksize=2)
+    
+    # the longest gap straddles the boundary between the second and third chunk
+    assert find_longest_timegap_chunked(chunks, column='observation_time') == 23.75
+    assert find_longest_timegap(times.sample(frac=1, random_state=0)) == 23.75
+    with pytest.raises(ValueError):
+        find_longest_timegap_chunked([times[3:], times[:3]])
+    assert np.isnan(find_longest_timegap(times[:1])) and np.isnan(find_longest_timegap_chunked([]))
+    
+
+def test_find_longest_timegap_sub_second():
+    # the result must match total_seconds() / 3600 bit for bit, whatever resolution the times are parsed at
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        offsets = pd.to_timedelta(np.sort(rng.uniform(0, 1e7, 20)), unit='s')
+        times = pd.Series((pd.Timestamp("2022-10-01") + offsets).strftime('%Y-%m-%d %H:%M:%S.%f'))
+        expected = pd.to_datetime(times).diff().dt.total_seconds().max() / 3600
+        assert type(find_longest_timegap(times)) is np.float64
+        assert find_longest_timegap(times) == expected
+        assert find_longest_timegap_chunked([times[:7], times[7:]]) == expected
+        
+
+def test_top_timegaps_by_group():
+    times = pd.Series(["2022-10-01 00:00", "2022-10-01 01:00", "2022-10-01 00:00", "2022-10-01 04:00",
+                       "2022-10-01 03:00", "2022-10-01 01:30"])
+    stations = pd.Series(['KLAF', 'KLAF', 'KIND', 'KLAF', 'KIND', 'KIND'], name='station')
+    gaps = top_timegaps_by_group(times, stations, k=2)
+    assert list(gaps['station']) == ['KIND', 'KIND', 'KLAF', 'KLAF']
+    assert list(gaps['gap_hours']) == [1.5, 1.5, 3.0, 1.0]
+    assert gaps.loc[2, 'start'] == pd.Timestamp("2022-10-01 01:00")
+    
+
 def test_space_in_dir():
     assert space_in_dir("/anvil/projects/tdm/bin") == 338665316
     
 
+def test_space_in_dir_scandir(tmp_path):
+    root = tmp_path / "tree"
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "c").mkdir()
+    (root / "top.txt").write_bytes(b"x" * 10)
+    (root / ".hidden").write_bytes(b"x" * 5)
+    (root / "a" / "one.bin").write_bytes(b"x" * 100)
+    (root / "a" / "b" / "two.bin").write_bytes(b"x" * 1000)
+    (root / "c" / "link.bin").symlink_to(root / "a" / "one.bin")
+    (root / "c" / "dirlink").symlink_to(root / "a")
+    (root / "c" / "broken").symlink_to(root / "nowhere")
+    
+    expected = sum(f.stat().st_size for f in Path(root).glob('**/*') if f.is_file())
+    assert space_in_dir(str(root), workers=2) == expected == 1215
+    assert dir_space_breakdown(str(root)) == {'.': 15, 'a': 1100, 'c': 100}
+    
+    cache_path = tmp_path / "sizes.json"
+    assert space_in_dir(str(root), cache_path=str(cache_path)) == 1215
+    # a new file changes its directory's mtime, so that directory is re-listed
+    (root / "a" / "b" / "three.bin").write_bytes(b"x" * 7)
+    os.utime(root / "a" / "b", ns=(0, 1))
+    assert dir_space_breakdown(str(root), cache_path=str(cache_path)) == {'.': 15, 'a': 1107, 'c': 100}
+    
+
+def test_space_in_dir_vanishing_entries(tmp_path, monkeypatch):
+    root = tmp_path / "tree"
+    (root / "gone").mkdir(parents=True)
+    (root / "kept").mkdir()
+    (root / "kept" / "one.bin").write_bytes(b"x" * 100)
+    (root / "top.txt").write_bytes(b"x" * 10)
+    # like Path.glob('**/*'), a file rather than a directory has nothing under it
+    assert space_in_dir(str(root / "top.txt")) == 0
+    
+    # a directory deleted between its stat and its listing is skipped, not fatal
+    scandir = os.scandir
+    def flaky_scandir(path):
+        if os.path.basename(path) == "gone":
+            raise FileNotFoundError(path)
+        return scandir(path)
+    monkeypatch.setattr(project06.os, "scandir", flaky_scandir)
+    assert dir_space_breakdown(str(root), workers=2) == {'.': 10, 'gone': 0, 'kept': 100}
+    
+
 def test_event_plotter():
     
     results = event_plotter("Swimming Men's 100 metres Backstroke")
@@ -42,6 +132,127 @@ def test_event_plotter():
     assert bronze == '363a6fed2372a0dcab9ab5429daa1f78e5b236004612c3dcfbcae901f2d8329a'
     assert silver == '9b8af11195fdef3dbe4b136854dab83c6216dc52012fb5796c8e7db14dc35022'
     
+def _write_athlete_events(csv):
+    pd.DataFrame({
+        'ID': [1, 2, 3, 4, 5, 6, 7],
+        'Name': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+        'Age': [20, 22, None, 30, 25, 19, 40],
+        'NOC': ['USA', 'USA', 'USA', 'AUS', 'AUS', 'JPN', 'USA'],
+        'Event': ['Backstroke'] * 6 + ['Marathon'],
+        'Medal': ['Gold', 'Gold', 'Gold', 'Silver', None, 'Bronze', 'Gold'],
+    }).to_csv(csv, index=False)
+
+
+def test_medal_summary(tmp_path):
+    csv = tmp_path / "athlete_events.csv"
+    _write_athlete_events(csv)
+    cache_path = tmp_path / "athlete_events.pkl"
+    
+    dat = load_athlete_events(str(csv), str(cache_path))
+    assert str(dat['Medal'].dtype) == 'category'
+    assert cache_path.exists()
+    
+    summary = medal_summary(str(csv))
+    backstroke = summary['Backstroke']
+    assert list(backstroke.columns) == ['Medal', 'NOC', 'Age', 'Count']
+    assert list(backstroke['Medal']) == ['Bronze', 'Gold', 'Silver']
+    assert backstroke.loc[(backstroke['Medal']=='Gold') & (backstroke['NOC']=='USA'),'Age'].values[0] == 21.0
+    assert backstroke.loc[(backstroke['Medal']=='Gold') & (backstroke['NOC']=='USA'),'Count'].values[0] == 3
+    assert summary['Marathon'].shape == (1, 4)
+    
+
+def test_event_plotter_cache_path(tmp_path, monkeypatch):
+    csv = tmp_path / "athlete_events.csv"
+    _write_athlete_events(csv)
+    cache_path = tmp_path / "athlete_events.pkl"
+    monkeypatch.setattr(project06, "render_figures", lambda figures, workers=None: [])
+    results = events_plotter(["Backstroke"], str(tmp_path / "plots"), path=str(csv), cache_path=str(cache_path))
+    assert cache_path.exists()
+    
+    # a fresh process, like the nightly job, reads the pickle instead of parsing the csv
+    code = f"""
+import pandas as pd
+def read_csv(*args, **kwargs):
+    raise AssertionError("parsed the csv")
+pd.read_csv = read_csv
+import project06
+project06.render_figures = lambda figures, workers=None: []
+dat = project06.event_plotter("Backstroke", path={str(csv)!r}, output_dir={str(tmp_path)!r}, headless=True,
+                              cache_path={str(cache_path)!r})
+print(dat.to_json())
+"""
+    output = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent, check=True,
+                            capture_output=True, text=True).stdout
+    assert output.strip() == results["Backstroke"].to_json()
+    
+
+def test_render_figures_skips_unchanged(tmp_path):
+    import plotly.express as px
+    fig = px.bar(x=['USA', 'AUS'], y=[3, 1], text=[21.0, 30.0], title="Gold")
+    image_path = tmp_path / "gold.jpeg"
+    image_path.write_bytes(b"already rendered")
+    digest = hashlib.sha256(fig.to_json().encode('utf-8')).hexdigest()
+    (tmp_path / "gold.jpeg.sha256").write_text(digest)
+    
+    # same data and layout: nothing is exported again
+    assert render_figures({str(image_path): fig}) == []
+    assert image_path.read_bytes() == b"already rendered"
+    
+
 def test_player_info():
     info = player_info("vinicius junior")
-    assert info=='Name: Vinicius Júnior\nBirthday: July 12, 2000\nTotal goals: 37'
\ No newline at end of file
+    assert info=='Name: Vinicius Júnior\nBirthday: July 12, 2000\nTotal goals: 37'
+
+PLAYERS_INDEX = """<html><body>
+<div id="all_players"><div class="section_content">
+<p><a href="/en/players/7111d552/Vinicius-Junior">Vinicius Júnior</a></p>
+<p><a href="/en/players/0a0a0a0a/Juninho">Juninho</a></p>
+</div></div></body></html>"""
+
+PLAYER_PAGE = """<html><body>
+<div id="info"><div id="meta"><h1><span>{name}</span></h1><p><span data-birth="2000-07-12"> July 12, 2000 </span></p></div></div>
+<table id="stats_standard_dom_lg"><tr id="stats"><td data-stat="goals">{goals}</td></tr>
+<tr id="stats"><td data-stat="goals">7</td></tr></table>
+</body></html>"""
+
+
+@pytest.fixture
+def fbref_server():
+    """
+    A local stand-in for fbref.com serving saved pages with ETags. Records
+    each request's path and If-None-Match header.
+    """
+    pages = {
+        '/en/players/ju/': PLAYERS_INDEX,
+        '/en/players/7111d552/': PLAYER_PAGE.format(name='Vinicius Júnior', goals=30),
+        '/en/players/0a0a0a0a/': PLAYER_PAGE.format(name='Juninho', goals=1),
+    }
+    requested = []
+    
+    def respond(path, headers):
+        requested.append((path, headers.get('If-None-Match')))
+        if path not in pages:
+            return 404, {}, b''
+        etag = '"' + hashlib.sha256(pages[path].encode()).hexdigest() + '"'
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}, pages[path].encode()
+    
+    with stand_in_server(respond) as (base_url, _):
+        yield base_url, requested
+
+
+def test_players_info(fbref_server, tmp_path):
+    base_url, hits = fbref_server
+    info = players_info(["vinicius junior", "juninho"], base_url=base_url, cache_dir=str(tmp_path))
+    assert info == ['Name: Vinicius Júnior\nBirthday: July 12, 2000\nTotal goals: 37',
+                    'Name: Juninho\nBirthday: July 12, 2000\nTotal goals: 8']
+    # both names share the 'ju' index page, which is fetched once
+    assert [path for path, _ in hits].count('/en/players/ju/') == 1
+    
+    # the second time around every page is re-validated with its ETag
+    assert player_info("vinicius junior", base_url=base_url, cache_dir=str(tmp_path)) == info[0]
+    assert all(etag is not None for _, etag in hits[3:])
+    
+    with pytest.raises(ValueError):
+        player_info("nobody junebug", base_url=base_url)
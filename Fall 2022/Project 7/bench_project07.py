@@ -0,0 +1,97 @@
+"""
+Benchmarks for `project07.py`, run against synthetic csv files shaped like
+`metabolites.csv` (an mz column followed by one intensity column per sample).
+
+Usage:
+    python bench_project07.py
+"""
+
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import project07
+
+
+def make_synthetic_metabolites(file_path: str, number_features: int, number_samples: int = 12, seed: int = 0) -> None:
+    """
+    Write a `metabolites.csv` shaped file with `number_features` mz values and `number_samples` samples.
+    """
+    rng = np.random.default_rng(seed)
+    mz = np.round(rng.uniform(50, 1200, number_features), 7)
+    data = {'mz': mz}
+    for i in range(number_samples):
+        group = ['KOGCHUM', 'WTGCHUM', 'KORCHUM', 'WTRCHUM'][i % 4]
+        data[f'{group}{i // 4 + 1}'] = rng.lognormal(11, 1.5, number_features)
+    pd.DataFrame(data).to_csv(file_path, index=False)
+
+
+def _extract_mz_loop(file_path: str) -> pd.DataFrame:
+    """
+    The original cell by cell implementation of `extract_mz`, kept as a baseline.
+    """
+    df = pd.read_csv(file_path)
+    df = df.sort_values(by='mz', ascending= True, ignore_index = True)
+    cols = list(df['mz'])
+    df = df.drop(columns = 'mz')
+    new_cols = pd.DataFrame({'Samples': df.columns})
+    new_df = pd.DataFrame(np.zeros((len(df.columns), len(cols))), columns = cols)
+    for j in range(len(df.columns)):
+        for i in range(len(cols)):
+            new_df.iloc[j, i] = df.iloc[i, j]
+    new_df = pd.concat([new_df, new_cols], axis = 1)
+    new_df.insert(0, 'Samples', new_df.pop('Samples'))
+    return new_df
+
+
+def _timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_extract_mz(sizes=(500, 5_000, 50_000, 200_000), loop_limit: int = 500) -> None:
+    """
+    Time `extract_mz` on growing synthetic inputs, against the original loop for the small ones.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        for number_features in sizes:
+            file_path = Path(work_dir) / f'metabolites_{number_features}.csv'
+            make_synthetic_metabolites(file_path, number_features)
+            line = f'extract_mz ({number_features} features): '
+            if number_features <= loop_limit:
+                line += f'loop {_timed(_extract_mz_loop, file_path):.3f}s, '
+            line += f'vectorized {_timed(project07.extract_mz, file_path):.3f}s, '
+            line += f'chunked float32 {_timed(project07.extract_mz, file_path, chunksize=50_000):.3f}s'
+            print(line)
+
+
+def bench_align_mz(number_files: int = 24, sizes=(1_000, 10_000, 50_000), ppm: float = 10.0) -> None:
+    """
+    Time `align_mz` on `number_files` runs of growing size, each a copy of one synthetic run with every mz
+    shifted by a few ppm and renamed samples.
+    """
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as work_dir:
+        for number_features in sizes:
+            base_path = Path(work_dir) / 'base.csv'
+            make_synthetic_metabolites(base_path, number_features)
+            base = pd.read_csv(base_path)
+            file_paths = []
+            for i in range(number_files):
+                run = base.copy()
+                run['mz'] = run['mz'] * (1 + rng.normal(0, 2, len(run)) * 1e-6)
+                run.columns = ['mz'] + [f'{col}_run{i}' for col in base.columns[1:]]
+                file_paths.append(Path(work_dir) / f'run{i}.csv')
+                run.to_csv(file_paths[-1], index = False)
+            seconds = _timed(project07.align_mz, file_paths, ppm = ppm)
+            total_peaks = number_files * number_features
+            print(f'align_mz ({number_files} files, {total_peaks} peaks): {seconds:.3f}s, {total_peaks / seconds:.0f} peaks/s')
+
+
+if __name__ == '__main__':
+    bench_extract_mz()
+    bench_align_mz()
@@ -4,90 +4,286 @@
 import pandas as pd
 import numpy as np
 import math
+import os
+import json
+import shutil
+import uuid
+import hashlib
+from pathlib import Path
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib as mp
 import plotly.express as px
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.utils import gen_batches
 
-def extract_mz(file_path:str) -> 'pandas.core.frame.DataFrame':
+def extract_mz(file_path:str, chunksize:int = None) -> 'pandas.core.frame.DataFrame':
     """
      Given a file path or file name of a csv file in the active working directory, extract_mz will return a
      DataFrame organized with mz being the set of features
     Args:
         file path: The path or file name to the `.csv` file.
+        chunksize: if given, the csv is read this many rows (mz values) at a time, and each chunk is written
+            straight into a preallocated float32 samples x mz array, so memory peaks at the output plus one
+            chunk rather than at a full float64 copy of the file. Default None reads the whole file as float64.
 
     Returns:
         A sorted (by ascending mz values) DataFrame organized with mz as the columns and Samples as the rows being the set of features.
     
-    Ultimately this script uses a for loop which indexes a row and column of a data frame of zeros of a predetermined size and replaces each value 
-    with the corresponding value of each data point from the data frame that contains the metabolite data. The final data frame consists of the 
-    organized data with the mz values as column headers and a new samples column with the name of the samples as the first column.
+    The data is sorted by mz and transposed in one step so the mz values become the column headers, and
+    a new samples column with the name of the samples is inserted as the first column. With chunksize, the mz
+    column is read first on its own and argsorted, so every chunk can be written to its sorted columns directly.
     
     """
     
+    if chunksize:
+        header = pd.read_csv(file_path, nrows = 0).columns #reads only the column names
+        samples = [col for col in header if col != 'mz']
+        mz = pd.read_csv(file_path, usecols = ['mz'], dtype = {'mz': 'float64'})['mz'].to_numpy() #keeps full precision for mz values
+        order = np.argsort(mz, kind = 'stable')
+        position = np.empty_like(order) #the sorted column each row of the file ends up in
+        position[order] = np.arange(len(order))
+        values = np.empty((len(samples), len(mz)), dtype = np.float32)
+        start = 0
+        for chunk in pd.read_csv(file_path, chunksize = chunksize, usecols = samples, dtype = np.float32):
+            stop = start + len(chunk)
+            values[:, position[start:stop]] = chunk[samples].to_numpy().T
+            start = stop
+        new_df = pd.DataFrame(values, columns = list(mz[order]), copy = False)
+        new_df.insert(0, 'Samples', pd.Series(samples))
+        return new_df
+    
     df = pd.read_csv(file_path)
     df = df.sort_values(by='mz', ascending= True, ignore_index = True) #sorts the data according to ascending mz values
     cols = list(df['mz']) #converts sorted mz values into a list
     df = df.drop(columns = 'mz') #drops the 'mz' values column
-    new_cols = pd.DataFrame({'Samples': df.columns}) #dummy data frame to acquire dimensions
-    col_len = len(cols) #calculates the length of the new column headers or the 'mz' column of the original dataset
-    row_len = len(df.columns) #calculates the length of rows for the new dataframe
-    new_df = pd.DataFrame(np.zeros((row_len, col_len)), columns = cols) #generates a data frame of zeros in the dimensions of the new dataframe with 'mz' values as headers
-    
-    #the for loops below index the row of the new data frame and fill in the values as necessary
-    for j in list(range(0, row_len)):
-        for i in list(range(0, col_len)):
-            new_df.iloc[j, i] = df.iloc[i,j]
-            
-    new_df = pd.concat([new_df, new_cols], axis = 1) #vertically concatenates Samples columns
-    first = new_df.pop('Samples') #removes Samples column from dataframe and stores in in this variable
-    newer_df = new_df.insert(0, 'Samples', first) #inserts removed samples column as the first column
-        
+    
+    new_df = pd.DataFrame(df.to_numpy(dtype = np.float64).T, columns = cols) #transposes the data so each row is a sample and each column an mz value
+    new_df.insert(0, 'Samples', pd.Series(df.columns)) #inserts the sample names as the first column
 
-        
     return new_df #should return a data frame with columns that equal the length of the sample columns and columns that equal the length of the column headers 
 
 
 
 
-def mz_datastd(dataframe):
+def _row_batches(n_rows, chunksize, min_size = 0):
+    """
+    Slices covering range(n_rows) in chunks of `chunksize` rows, with the last chunk merged into
+    the one before it if it would have fewer than `min_size` rows.
+    """
+    return list(gen_batches(n_rows, max(chunksize, min_size), min_batch_size = min_size))
+
+
+def _output_array(shape, out_path = None):
+    """
+    An empty float64 array of `shape`, memory-mapped to the `.npy` file `out_path` if one is given.
+    """
+    if out_path:
+        return np.lib.format.open_memmap(out_path, mode = 'w+', dtype = np.float64, shape = shape)
+    return np.empty(shape, dtype = np.float64)
+
+
+def align_mz(file_paths, ppm = 10.0) -> 'pandas.core.frame.DataFrame':
+    """
+     Given a list of csv files shaped like the one extract_mz reads (an mz column followed by one column per sample),
+     align_mz merges them into a single DataFrame, treating mz values that differ by no more than `ppm` parts per
+     million as the same feature.
+    Args:
+        file_paths: the paths or file names of the `.csv` files.
+        ppm: the mz tolerance, in parts per million, between a peak and the mean mz of the feature it joins.
+
+    Returns:
+        A DataFrame organized like the output of extract_mz, ready for mz_datastd: a Samples column followed by one
+        column per aligned feature, labeled with the feature's mean mz, in ascending order. A sample with no peak for
+        a feature gets 0.
+    
+    All peaks from all files are sorted together once and grouped into features in a single pass: a peak joins the
+    current feature if it is within `ppm` of that feature's mean mz so far and its file has no peak in the feature yet,
+    otherwise it starts a new feature. So closely spaced peaks can't chain a feature wider than the tolerance, and two
+    peaks from the same file are never merged. Apart from the sort, the alignment is linear in the number of peaks.
+    
+    """
+    runs = [pd.read_csv(file_path) for file_path in file_paths]
+    samples = [col for run in runs for col in run.columns if col != 'mz']
+    if len(set(samples)) != len(samples):
+        raise ValueError("Sample names must be unique across the files being aligned.")
+    
+    run_mz = [run['mz'].to_numpy(dtype = np.float64) for run in runs]
+    all_mz = np.concatenate(run_mz)
+    if len(all_mz) == 0:
+        return pd.DataFrame({'Samples': samples})
+    run_of_peak = np.repeat(np.arange(len(runs)), [len(mz) for mz in run_mz])
+    order = np.argsort(all_mz, kind = 'stable')
+    sorted_mz = all_mz[order]
+    
+    feature_of_sorted = np.empty(len(all_mz), dtype = np.int64)
+    n_features, total, count, seen = 0, 0.0, 0, set()
+    tolerance = 1 + ppm * 1e-6
+    for i, (mz, run_index) in enumerate(zip(sorted_mz.tolist(), run_of_peak[order].tolist())):
+        # peaks arrive in ascending order, so only the upper side of the centroid needs checking
+        if count and mz * count <= total * tolerance and run_index not in seen:
+            total += mz
+            count += 1
+        else:
+            n_features += 1
+            total, count, seen = mz, 1, set()
+        seen.add(run_index)
+        feature_of_sorted[i] = n_features - 1
+    feature_mz = np.bincount(feature_of_sorted, weights = sorted_mz, minlength = n_features) / np.bincount(feature_of_sorted, minlength = n_features)
+    
+    feature_of_peak = np.empty_like(feature_of_sorted)
+    feature_of_peak[order] = feature_of_sorted
+    aligned = np.zeros((len(samples), n_features))
+    row, first_peak = 0, 0
+    for run, mz in zip(runs, run_mz):
+        features = feature_of_peak[first_peak:first_peak + len(mz)]
+        intensities = np.nan_to_num(run.drop(columns = 'mz').to_numpy(dtype = np.float64))
+        n_samples = intensities.shape[1]
+        aligned[row:row + n_samples, features] = intensities.T
+        row += n_samples
+        first_peak += len(mz)
+    
+    new_df = pd.DataFrame(aligned, columns = list(feature_mz))
+    new_df.insert(0, 'Samples', pd.Series(samples))
+    return new_df
+
+
+
+
+def standardize_values(values, chunksize = None, out_path = None):
+    """
+     Standardizes a samples x features array, like the values mz_datastd standardizes, without needing a DataFrame.
+    Args:
+        values: a numpy array or memmap, or the path to a `.npy` file, which is then opened memory-mapped (such as
+            the values.npy MetabolitePipeline caches).
+        chunksize: if given, the scaler is fit with partial fits over this many rows (samples) at a time and the
+            data is standardized one chunk at a time, so only one chunk of the input is ever read into memory.
+        out_path: if given, the standardized data is written to this `.npy` file and returned memory-mapped.
+    Returns:
+        x_val: the standardized data.
+    """
+    if isinstance(values, (str, Path)):
+        values = np.load(values, mmap_mode = 'r', allow_pickle = False)
+    if not (chunksize or out_path):
+        return StandardScaler().fit_transform(np.asarray(values))
+    
+    batches = _row_batches(values.shape[0], chunksize or values.shape[0])
+    scaler = StandardScaler()
+    for batch in batches:
+        scaler.partial_fit(np.asarray(values[batch], dtype = np.float64))
+    std_val = _output_array(values.shape, out_path)
+    for batch in batches:
+        std_val[batch] = scaler.transform(np.asarray(values[batch], dtype = np.float64))
+    return std_val
+
+
+def mz_datastd(dataframe, chunksize = None, out_path = None):
     """
      Uses a Data Frame organized using function mz_extract.
     Args:
-        dataframe: a data frame of organized metabolomics data
+        dataframe: a data frame of organized metabolomics data. A samples x mz numpy array or memmap, or the path
+            to one saved as `.npy`, is also accepted so data that doesn't fit in memory can be standardized, see
+            standardize_values.
+        chunksize: if given, the scaler is fit with partial fits over this many rows (samples) at a time
+            and the data is standardized one chunk at a time, so the full matrix is never copied at once.
+        out_path: if given, the standardized data is written to this `.npy` file and returned memory-mapped.
 
     Returns:
         mz_datastd returns 3 outputs
         x_val: standardized data using x components
         y_val: standardized data using y components
         new_df: data fram containing all standardized data organized by mz values as column headers
+            (numbered columns when the input is an array)
     
     This functions allows extracted mass spectral metabolomics data from a data frame to be prepared for PCA processing.
     Prior to principal component analysis (PCA), the data must be mean centered and standardized. This function standardizes
     the data and out puts the x and y standardized data and a data frame which consists of only the x components since that
     is what we are interested in at the moment.
     """
+    if not isinstance(dataframe, pd.DataFrame):
+        x_val = standardize_values(dataframe, chunksize, out_path)
+        return x_val, pd.DataFrame(data = x_val, copy = False)
+    
     samples = [dataframe['Samples']]
     dataframe = dataframe.drop(columns = 'Samples')
     x_val = dataframe.loc[:, dataframe.columns].values
     #y_val = dataframe.loc[:, samples].values
-    x_val = StandardScaler().fit_transform(x_val)
+    x_val = standardize_values(x_val, chunksize, out_path)
     #y_val = StandardScaler().fit_transform(y_val)
-    new_df = pd.DataFrame(data = x_val, columns = dataframe.columns)
+    new_df = pd.DataFrame(data = x_val, columns = dataframe.columns, copy = False)
 
     return x_val, new_df
 
 
 
     
+def _pc_colnames(num_comp):
+    return ['PC ' + str(count + 1) for count in range(num_comp)]
+
+
+def pca_scores(std_data, num_comp, batch_size = None, scores_path = None, svd_solver = 'auto'):
+    """
+     Fits PCA to standardized data and returns the principal component scores.
+    Args:
+        std_data: standardized data.
+        num_comp: number of components
+        batch_size: if given, an IncrementalPCA is fit over this many rows at a time and the scores are
+            computed a batch at a time, so the data never has to be in memory all at once.
+        scores_path: if given, the scores are written to this `.npy` file and returned memory-mapped.
+        svd_solver: the PCA solver used when batch_size is not given, e.g. 'randomized' for a
+            randomized SVD of large matrices.
+    Returns:
+        PC: numpy array with the scores of each sample on each component.
+    """
+    if not batch_size:
+        PC = PCA(n_components = num_comp, svd_solver = svd_solver).fit_transform(std_data)
+        if scores_path:
+            scores = _output_array(PC.shape, scores_path)
+            scores[:] = PC
+            PC = scores
+        return PC
+    
+    batches = _row_batches(std_data.shape[0], batch_size, min_size = num_comp)
+    met_pca = IncrementalPCA(n_components = num_comp)
+    for batch in batches:
+        met_pca.partial_fit(std_data[batch])
+    PC = _output_array((std_data.shape[0], num_comp), scores_path)
+    for batch in batches:
+        PC[batch] = met_pca.transform(std_data[batch])
+    return PC
+
+
+
+    
     
-def met_pca(dataframe, std_data, num_comp):
+def _pca_figure(comp_df, PC, max_points = 5000, seed = 0):
+    """
+     Builds the figure met_pca shows. Up to max_points samples get the scatter matrix of the first two components.
+     Above that, every sample drawn as an svg marker makes the plot too slow to use, so a random subset of max_points
+     samples is drawn with WebGL (scattergl) instead.
+    """
+    if len(comp_df) <= max_points:
+        return px.scatter_matrix(PC, dimensions=range(2), color = comp_df['Samples'])
+    rows = np.sort(np.random.default_rng(seed).choice(len(comp_df), max_points, replace = False))
+    fig = px.scatter(comp_df.iloc[rows], x = 'PC 1', y = 'PC 2', color = 'Samples', render_mode = 'webgl',
+                     title = f'{max_points} of {len(comp_df)} samples')
+    return fig
+
+
+def met_pca(dataframe, std_data, num_comp, batch_size = None, scores_path = None, svd_solver = 'auto',
+            plot = True, max_points = 5000):
     """
      Uses a Data Frame organized using function mz_extract.
     Args:
         dataframe: dataframe that contains standardized data.
         std_data: standardized data.
         num_comp: number of components
+        batch_size: if given, PCA is fit incrementally over this many rows at a time, see pca_scores.
+        scores_path: if given, the PCA scores are written to this `.npy` file and returned memory-mapped.
+        svd_solver: the PCA solver, e.g. 'randomized', used when batch_size is not given.
+        plot: if False, no figure is built or shown, for batch runs and tests. Default True.
+        max_points: above this many samples the plot is a downsampled WebGL scatter of PC 1 and PC 2.
     Returns:
         met_pca returns 3 outputs
         comp_df: data frame with labeled pca scatter matrix data.
@@ -103,19 +299,213 @@ def met_pca(dataframe, std_data, num_comp):
     
     """
     
-    pc_colnames = []
-    met_pca = PCA(n_components = num_comp)
-    count = 0
-    pc_count = 1
-    while count < num_comp:
-        pc_colnames.append('PC ' + str(pc_count + count))
-        count += 1
-        
-    PC = met_pca.fit_transform(std_data)
+    pc_colnames = _pc_colnames(num_comp)
+    PC = pca_scores(std_data, num_comp, batch_size, scores_path, svd_solver)
     pc_df = pd.DataFrame(data = PC, columns = pc_colnames)
     comp_df = pd.concat([pc_df, dataframe[['Samples']]], axis = 1)
-    fig = px.scatter_matrix(PC, dimensions=range(2), color = dataframe['Samples'],
-                       )
+    if plot:
+        fig = _pca_figure(comp_df, PC, max_points)
 #fig.update_traces(diagonal_visible=False)
-    fig.show()
-    return comp_df, PC
\ No newline at end of file
+        fig.show()
+    return comp_df, PC
+
+
+
+
+_bootstrap_shared = {}
+
+
+def _attach_bootstrap_data(shm_name, shape, dtype, reference):
+    """
+    Worker initializer for bootstrap_pca: map the standardized data from shared memory instead of receiving a copy.
+    """
+    shm = shared_memory.SharedMemory(name = shm_name)
+    _bootstrap_shared['shm'] = shm
+    _bootstrap_shared['data'] = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+    _bootstrap_shared['reference'] = reference
+
+
+def _bootstrap_batch(seeds, num_comp):
+    """
+    Fit PCA to one bootstrap resample of the shared data per seed, flipping each component's sign to agree with
+    the full data PCA so loadings can be compared across resamples.
+    """
+    data = _bootstrap_shared['data']
+    reference = _bootstrap_shared['reference']
+    loadings = np.empty((len(seeds), num_comp, data.shape[1]))
+    variance = np.empty((len(seeds), num_comp))
+    for i, seed in enumerate(seeds):
+        rows = np.random.default_rng(seed).integers(0, data.shape[0], data.shape[0])
+        boot_pca = PCA(n_components = num_comp).fit(data[rows])
+        signs = np.sign(np.sum(boot_pca.components_ * reference, axis = 1))
+        signs[signs == 0] = 1
+        loadings[i] = boot_pca.components_ * signs[:, None]
+        variance[i] = boot_pca.explained_variance_ratio_
+    return loadings, variance
+
+
+def bootstrap_pca(std_data, num_comp, n_boot, workers = None, seed = 0, ci = 0.95):
+    """
+     Estimates how stable the principal components of standardized data are by refitting PCA to bootstrap resamples
+     of the samples.
+    Args:
+        std_data: standardized data, e.g. the x_val output of mz_datastd.
+        num_comp: number of components
+        n_boot: number of bootstrap resamples.
+        workers: number of processes the resamples are spread across. Defaults to the number of CPUs.
+        seed: seed for drawing the resamples, so results are reproducible.
+        ci: width of the loading confidence intervals. Default 0.95.
+    Returns:
+        bootstrap_pca returns 3 outputs
+        ci_lower: numpy array (num_comp x features) with the lower bound of each loading.
+        ci_upper: numpy array (num_comp x features) with the upper bound of each loading.
+        boot_var: data frame with the explained variance ratio of each component (columns) in each resample (rows).
+    
+    The standardized data is copied once into shared memory that every worker maps, rather than being pickled and
+    sent with each task. The sign of each resampled component is aligned with the same component fit on the full
+    data before the percentile intervals are taken.
+    """
+    std_data = np.ascontiguousarray(std_data, dtype = np.float64)
+    reference = PCA(n_components = num_comp).fit(std_data).components_
+    seeds = np.random.default_rng(seed).integers(0, 2**63 - 1, n_boot)
+    workers = workers or os.cpu_count() or 1
+    batches = [batch for batch in np.array_split(seeds, min(n_boot, workers * 4)) if len(batch)]
+    
+    shm = shared_memory.SharedMemory(create = True, size = max(std_data.nbytes, 1))
+    try:
+        np.ndarray(std_data.shape, dtype = std_data.dtype, buffer = shm.buf)[:] = std_data
+        initargs = (shm.name, std_data.shape, std_data.dtype, reference)
+        if workers == 1:
+            _attach_bootstrap_data(*initargs)
+            results = [_bootstrap_batch(batch, num_comp) for batch in batches]
+            _bootstrap_shared.clear()
+        else:
+            with ProcessPoolExecutor(max_workers = workers, initializer = _attach_bootstrap_data, initargs = initargs) as pool:
+                results = list(pool.map(_bootstrap_batch, batches, [num_comp] * len(batches)))
+    finally:
+        shm.close()
+        shm.unlink()
+    
+    loadings = np.concatenate([result[0] for result in results])
+    variance = np.concatenate([result[1] for result in results])
+    alpha = (1 - ci) / 2
+    ci_lower = np.quantile(loadings, alpha, axis = 0)
+    ci_upper = np.quantile(loadings, 1 - alpha, axis = 0)
+    boot_var = pd.DataFrame(data = variance, columns = _pc_colnames(num_comp))
+    return ci_lower, ci_upper, boot_var
+
+
+
+
+class MetabolitePipeline:
+    """
+     Runs extract_mz, mz_datastd and PCA on one csv file, caching the output of every stage on disk as `.npy` files.
+    Args:
+        file_path: The path or file name to the `.csv` file.
+        cache_dir: the directory the stage outputs are cached in.
+        chunksize: passed on to extract_mz and mz_datastd to read and standardize the data in chunks.
+
+    Each stage's cache key is the SHA-256 of the csv contents plus the pipeline's and the stage's parameters, so
+    changing `num_comp` reuses the cached standardized data, and editing the csv invalidates everything. Cached
+    arrays are loaded memory-mapped, so a warm start does not read the csv at all. The csv's hash is itself
+    remembered by size and modification time so it is only recomputed when the file changes.
+    
+    Example:
+        pipeline = MetabolitePipeline('metabolites.csv')
+        df = pipeline.extract()
+        x_val, std_df = pipeline.standardize()
+        comp_df, PC = pipeline.pca(5)
+    """
+    
+    def __init__(self, file_path, cache_dir = '.metabolite_cache', chunksize = None):
+        self.file_path = Path(file_path)
+        self.cache_dir = Path(cache_dir)
+        self.chunksize = chunksize
+        self._file_hash = None
+        
+    def file_hash(self):
+        """
+        The SHA-256 of the csv contents, remembered in the cache directory by file size and modification time.
+        """
+        if self._file_hash is None:
+            stat = os.stat(self.file_path)
+            hashes_path = self.cache_dir / 'file_hashes.json'
+            hashes = json.loads(hashes_path.read_text()) if hashes_path.exists() else {}
+            key = str(self.file_path.resolve())
+            if hashes.get(key, [None, None, None])[:2] == [stat.st_size, stat.st_mtime_ns]:
+                self._file_hash = hashes[key][2]
+            else:
+                sha = hashlib.sha256()
+                with open(self.file_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        sha.update(block)
+                self._file_hash = sha.hexdigest()
+                hashes[key] = [stat.st_size, stat.st_mtime_ns, self._file_hash]
+                self.cache_dir.mkdir(parents = True, exist_ok = True)
+                tmp_path = hashes_path.with_name(f'{hashes_path.name}.{uuid.uuid4().hex}.tmp')
+                tmp_path.write_text(json.dumps(hashes))
+                os.replace(tmp_path, hashes_path)
+        return self._file_hash
+    
+    def _stage_dir(self, stage, **params):
+        key = json.dumps({'file': self.file_hash(), 'stage': stage, 'chunksize': self.chunksize, **params}, sort_keys = True)
+        return self.cache_dir / f"{stage}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:20]}"
+    
+    def _cached(self, stage_dir, names, compute):
+        """
+        Load the arrays `names` from `stage_dir`, memory-mapped, after running `compute` to create them if needed.
+        """
+        if not stage_dir.exists():
+            tmp_dir = stage_dir.with_name(f'{stage_dir.name}.{uuid.uuid4().hex}.tmp')
+            tmp_dir.mkdir(parents = True)
+            for name, array in compute().items():
+                np.save(tmp_dir / f'{name}.npy', np.asarray(array), allow_pickle = False)
+            try:
+                os.replace(tmp_dir, stage_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir) #another process cached this stage first
+        return [np.load(stage_dir / f'{name}.npy', mmap_mode = 'r', allow_pickle = False) for name in names]
+            
+    def _extract_arrays(self):
+        def compute():
+            df = extract_mz(self.file_path, chunksize = self.chunksize)
+            return {'samples': df['Samples'].to_numpy(dtype = str), 'mz': np.asarray(df.columns[1:], dtype = np.float64),
+                    'values': df.iloc[:, 1:].to_numpy()}
+        return self._cached(self._stage_dir('extract'), ['samples', 'mz', 'values'], compute)
+        
+    def extract(self):
+        """
+        The output of extract_mz for the csv.
+        """
+        samples, mz, values = self._extract_arrays()
+        new_df = pd.DataFrame(values, columns = list(mz), copy = False)
+        new_df.insert(0, 'Samples', pd.Series(samples.tolist()))
+        return new_df
+    
+    def _standardized(self):
+        def compute():
+            _, _, values = self._extract_arrays()
+            return {'std': standardize_values(values, chunksize = self.chunksize)}
+        return self._cached(self._stage_dir('standardize'), ['std'], compute)[0]
+    
+    def standardize(self):
+        """
+        The output of mz_datastd on the extracted data.
+        """
+        x_val = self._standardized()
+        _, mz, _ = self._extract_arrays()
+        columns = pd.Index(mz.tolist(), dtype = object) #same column index mz_datastd returns
+        return x_val, pd.DataFrame(data = x_val, columns = columns, copy = False)
+    
+    def pca(self, num_comp, batch_size = None, svd_solver = 'auto'):
+        """
+        The comp_df and PC outputs of met_pca on the standardized data, without plotting. See pca_scores for
+        `batch_size` and `svd_solver`.
+        """
+        stage_dir = self._stage_dir('pca', num_comp = num_comp, batch_size = batch_size, svd_solver = svd_solver)
+        PC, = self._cached(stage_dir, ['pc'],
+                           lambda: {'pc': pca_scores(self._standardized(), num_comp, batch_size, svd_solver = svd_solver)})
+        samples, _, _ = self._extract_arrays()
+        pc_df = pd.DataFrame(data = PC, columns = _pc_colnames(num_comp))
+        comp_df = pd.concat([pc_df, pd.DataFrame({'Samples': samples.tolist()})], axis = 1)
+        return comp_df, PC
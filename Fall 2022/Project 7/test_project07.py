@@ -7,7 +7,8 @@ import matplotlib as mp
 import plotly.express as px
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
-from project07 import extract_mz, mz_datastd, met_pca
+from project07 import extract_mz, mz_datastd, standardize_values, met_pca, pca_scores, align_mz, bootstrap_pca, _pca_figure, MetabolitePipeline
+import project07
 
 @pytest.mark.parametrize('csv_file',[('metabolites.csv')])
 def test_extract_mz(csv_file: str):
@@ -15,6 +16,24 @@ def test_extract_mz(csv_file: str):
     assert len(df.columns) == 488
     assert df.shape == (12, 488)
         
+@pytest.mark.parametrize('csv_file',[('metabolites.csv')])
+def test_extract_mz_chunked(csv_file: str):
+    df = extract_mz(csv_file)
+    chunked_df = extract_mz(csv_file, chunksize = 100)
+    assert chunked_df.shape == (12, 488)
+    assert list(chunked_df.columns) == list(df.columns)
+    assert list(df.columns[1:]) == sorted(df.columns[1:])
+    assert list(chunked_df['Samples']) == list(df['Samples'])
+    assert chunked_df.iloc[:, 1:].dtypes.unique() == [np.float32]
+    assert np.allclose(chunked_df.iloc[:, 1:].to_numpy(), df.iloc[:, 1:].to_numpy(), rtol = 1e-6)
+
+def test_extract_mz_integer_intensities(tmp_path):
+    # integer intensities still come out as float64, like the original cell by cell version
+    pd.DataFrame({'mz': [200.5, 100.25], 'S1': [1, 2], 'S2': [3, 4]}).to_csv(tmp_path / 'ints.csv', index = False)
+    df = extract_mz(str(tmp_path / 'ints.csv'))
+    assert (df.iloc[:, 1:].dtypes == np.float64).all()
+    assert df.iloc[:, 1:].values.tolist() == [[2.0, 1.0], [4.0, 3.0]]
+        
 @pytest.mark.parametrize('csv_file',[('metabolites.csv')])
 def test_mz_datastd(csv_file: str):
     df = extract_mz(csv_file)
@@ -29,4 +48,140 @@ def test_met_pca(csv_file: str, num_comp: int):
     test_xvals, testdatastd_df = mz_datastd(df)
     pca_df, PC = met_pca(df, test_xvals, num_comp)
     assert len(pca_df.columns)-1 == 5
-    assert pca_df.shape == (12,6)
\ No newline at end of file
+    assert pca_df.shape == (12,6)
+
+@pytest.mark.parametrize('csv_file,chunksize',[('metabolites.csv',5)])
+def test_mz_datastd_chunked(csv_file: str, chunksize: int, tmp_path):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    chunked_xvals, chunked_df = mz_datastd(df, chunksize = chunksize, out_path = str(tmp_path / 'std.npy'))
+    assert isinstance(chunked_xvals, np.memmap)
+    assert chunked_df.shape == (12, 487)
+    assert np.allclose(chunked_xvals, test_xvals)
+
+@pytest.mark.parametrize('csv_file,chunksize',[('metabolites.csv',5)])
+def test_mz_datastd_memmap(csv_file: str, chunksize: int, tmp_path):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    np.save(tmp_path / 'values.npy', df.iloc[:, 1:].to_numpy())
+    values = np.load(tmp_path / 'values.npy', mmap_mode = 'r')
+    rows_read = []
+    class RowRecorder:
+        shape = values.shape
+        def __getitem__(self, rows):
+            rows_read.append(rows)
+            return values[rows]
+    x_val = standardize_values(RowRecorder(), chunksize = chunksize)
+    assert np.allclose(x_val, test_xvals)
+    # the input is only ever read a chunk of rows at a time
+    assert all(rows.stop - rows.start <= chunksize for rows in rows_read)
+    memmap_xvals, memmap_df = mz_datastd(str(tmp_path / 'values.npy'), chunksize = chunksize, out_path = str(tmp_path / 'std.npy'))
+    assert isinstance(memmap_xvals, np.memmap)
+    assert memmap_df.shape == (12, 487)
+    assert np.allclose(memmap_xvals, test_xvals)
+
+
+@pytest.mark.parametrize('csv_file,num_comp',[('metabolites.csv',5)])
+def test_met_pca_incremental(csv_file: str, num_comp: int, tmp_path):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    PC = pca_scores(test_xvals, num_comp)
+    # one batch holding every sample gives the same components as PCA, up to sign
+    incremental_PC = pca_scores(test_xvals, num_comp, batch_size = 12, scores_path = str(tmp_path / 'pc.npy'))
+    assert isinstance(incremental_PC, np.memmap)
+    assert np.allclose(np.abs(incremental_PC), np.abs(PC), atol = 1e-6)
+    pca_df, PC = met_pca(df, test_xvals, num_comp, batch_size = 4)
+    assert pca_df.shape == (12,6)
+
+
+@pytest.mark.parametrize('csv_file,num_comp',[('metabolites.csv',5)])
+def test_met_pca_no_plot(csv_file: str, num_comp: int, monkeypatch):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    monkeypatch.setattr(project07, '_pca_figure', lambda *args: pytest.fail('plot = False should not build a figure'))
+    pca_df, PC = met_pca(df, test_xvals, num_comp, plot = False)
+    assert pca_df.shape == (12,6)
+
+@pytest.mark.parametrize('csv_file,num_comp',[('metabolites.csv',3)])
+def test_pca_figure_downsampled(csv_file: str, num_comp: int):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    pca_df, PC = met_pca(df, test_xvals, num_comp, plot = False)
+    assert _pca_figure(pca_df, PC).data[0].type == 'splom'
+    fig = _pca_figure(pca_df, PC, max_points = 5)
+    assert {trace.type for trace in fig.data} == {'scattergl'}
+    assert sum(len(trace.x) for trace in fig.data) == 5
+
+
+@pytest.mark.parametrize('csv_file,num_comp,n_boot',[('metabolites.csv',3,20)])
+def test_bootstrap_pca(csv_file: str, num_comp: int, n_boot: int):
+    df = extract_mz(csv_file)
+    test_xvals, testdatastd_df = mz_datastd(df)
+    ci_lower, ci_upper, boot_var = bootstrap_pca(test_xvals, num_comp, n_boot, workers = 2)
+    assert ci_lower.shape == ci_upper.shape == (3, 487)
+    assert np.all(ci_lower <= ci_upper)
+    assert boot_var.shape == (20, 3)
+    assert list(boot_var.columns) == ['PC 1', 'PC 2', 'PC 3']
+    # sign alignment keeps the interval around the full data loadings rather than straddling zero
+    reference = PCA(n_components = num_comp).fit(test_xvals).components_[0]
+    assert np.mean((ci_lower[0] <= reference) & (reference <= ci_upper[0])) > 0.9
+    # the same seed gives the same resamples however the work is split
+    same_lower, same_upper, same_var = bootstrap_pca(test_xvals, num_comp, n_boot, workers = 1)
+    assert np.allclose(same_lower, ci_lower) and np.allclose(same_var, boot_var)
+
+
+def test_align_mz(tmp_path):
+    pd.DataFrame({'mz': [300.0, 100.0, 200.0], 'RUN1A': [3.0, 1.0, 2.0], 'RUN1B': [30.0, 10.0, 20.0]}).to_csv(tmp_path / 'run1.csv', index = False)
+    pd.DataFrame({'mz': [100.0005, 250.0, 300.0009], 'RUN2A': [4.0, 5.0, 6.0]}).to_csv(tmp_path / 'run2.csv', index = False)
+    aligned = align_mz([str(tmp_path / 'run1.csv'), str(tmp_path / 'run2.csv')], ppm = 10)
+    assert list(aligned['Samples']) == ['RUN1A', 'RUN1B', 'RUN2A']
+    assert np.allclose(list(aligned.columns[1:]), [100.00025, 200.0, 250.0, 300.00045])
+    assert aligned.iloc[:, 1:].values.tolist() == [[1.0, 2.0, 0.0, 3.0], [10.0, 20.0, 0.0, 30.0], [4.0, 0.0, 5.0, 6.0]]
+    test_xvals, testdatastd_df = mz_datastd(aligned)
+    assert testdatastd_df.shape == (3, 4)
+
+def test_align_mz_same_file_peaks(tmp_path):
+    # run1's two peaks are 5 ppm apart, closer than the tolerance, but must stay separate features
+    pd.DataFrame({'mz': [100.0, 100.0005], 'RUN1A': [1.0, 2.0]}).to_csv(tmp_path / 'run1.csv', index = False)
+    pd.DataFrame({'mz': [100.0003], 'RUN2A': [3.0]}).to_csv(tmp_path / 'run2.csv', index = False)
+    aligned = align_mz([str(tmp_path / 'run1.csv'), str(tmp_path / 'run2.csv')], ppm = 10)
+    assert np.allclose(list(aligned.columns[1:]), [100.00015, 100.0005])
+    assert aligned.iloc[:, 1:].values.tolist() == [[1.0, 2.0], [3.0, 0.0]]
+
+def test_align_mz_no_chaining(tmp_path):
+    # each peak is 8 ppm from the previous one, but the last is 12 ppm from the first two's centroid
+    for i, mz in enumerate([100.0, 100.0008, 100.0016]):
+        pd.DataFrame({'mz': [mz], f'RUN{i}A': [1.0]}).to_csv(tmp_path / f'run{i}.csv', index = False)
+    aligned = align_mz([str(tmp_path / f'run{i}.csv') for i in range(3)], ppm = 10)
+    assert np.allclose(list(aligned.columns[1:]), [100.0004, 100.0016])
+
+@pytest.mark.parametrize('csv_file',[('metabolites.csv')])
+def test_align_mz_single_file(csv_file: str):
+    # with a tolerance below the closest pair of peaks, aligning one file is the same as extracting it
+    pd.testing.assert_frame_equal(align_mz([csv_file], ppm = 0.1), extract_mz(csv_file))
+    with pytest.raises(ValueError):
+        align_mz([csv_file, csv_file])
+
+
+@pytest.mark.parametrize('csv_file',[('metabolites.csv')])
+def test_metabolite_pipeline_cache(csv_file: str, tmp_path, monkeypatch):
+    pipeline = MetabolitePipeline(csv_file, cache_dir = str(tmp_path))
+    df = pipeline.extract()
+    pd.testing.assert_frame_equal(df, extract_mz(csv_file))
+    test_xvals, testdatastd_df = pipeline.standardize()
+    assert testdatastd_df.shape == (12, 487)
+    pca_df, PC = pipeline.pca(5)
+    assert pca_df.shape == (12,6)
+    
+    # a warm start, even with a new number of components, never goes back to the csv or re-standardizes
+    def fail(*args, **kwargs):
+        raise AssertionError("stage should have come from the cache")
+    monkeypatch.setattr(project07, 'extract_mz', fail)
+    monkeypatch.setattr(project07, 'mz_datastd', fail)
+    warm = MetabolitePipeline(csv_file, cache_dir = str(tmp_path))
+    warm_pca_df, warm_PC = warm.pca(5)
+    assert isinstance(warm_PC, np.memmap)
+    assert np.allclose(warm_PC, PC)
+    pca_df, PC = warm.pca(3)
+    assert pca_df.shape == (12,4)
+    assert list(pca_df['Samples']) == list(df['Samples'])
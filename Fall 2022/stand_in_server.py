@@ -0,0 +1,41 @@
+"""
+A local HTTP server for tests that stands in for a real website, shared by
+the tests of the projects that download things.
+"""
+
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+@contextmanager
+def stand_in_server(respond):
+    """
+    Serve GET requests on a local port with `respond(path, headers)`, which
+    returns (status, headers, body). Yields the base url and the list of
+    paths requested.
+    """
+    hits = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            hits.append(self.path)
+            status, headers, body = respond(self.path, self.headers)
+            self.send_response(status)
+            for name, value in {**headers, 'Content-Length': str(len(body))}.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}', hits
+    finally:
+        server.shutdown()
+        server.server_close()